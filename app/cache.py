@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+from contextlib import closing
+from typing import Any, Optional
+
+from app.metrics import Counter
+from app.logging_utils import get_logger
+
+logger = get_logger("cache")
+
+# ------------------------
+# Shared cache config
+# ------------------------
+# One SQLite file shared by every web/job worker on the host. /dev/shm (tmpfs)
+# keeps it in memory when available; otherwise it falls back to the temp dir.
+_DEFAULT_CACHE_DIR = "/dev/shm/synchro-cache" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "synchro-cache")
+CACHE_DIR = os.getenv("CACHE_DIR", _DEFAULT_CACHE_DIR)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") != "0"
+
+
+def _default_max_bytes() -> int:
+    # A quarter of the filesystem holding the cache, at most 256 MB: Docker's
+    # default /dev/shm is only 64 MB, and the SQLite WAL, metrics snapshots and
+    # in-memory upload files share it
+    path = CACHE_DIR
+    while not os.path.isdir(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return 48 * 1024 * 1024
+    return min(256 * 1024 * 1024, st.f_blocks * st.f_frsize // 4)
+
+
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", "0")) or _default_max_bytes()
+CACHE_TTL_SEC = float(os.getenv("CACHE_TTL_SEC", str(24 * 3600)))
+# Access times are only refreshed when older than this, so hot reads don't all write
+_TOUCH_INTERVAL_SEC = 60.0
+
+CACHE_REQUESTS = Counter("synchro_cache_requests_total", "Shared cache lookups.", ("cache", "result"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+
+def _hash_parts(digest, parts) -> None:
+    for part in parts:
+        data = part if isinstance(part, (bytes, bytearray, memoryview)) else json.dumps(part, sort_keys=True).encode()
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+
+
+def content_key(*parts: Any) -> str:
+    # Stable hash of request content (bytes are hashed raw, anything else as JSON)
+    digest = hashlib.sha256()
+    _hash_parts(digest, parts)
+    return digest.hexdigest()
+
+
+def file_content_key(path: str, *parts: Any) -> str:
+    # Same key as content_key(*parts, <file bytes>) without loading the file into memory
+    digest = hashlib.sha256()
+    _hash_parts(digest, parts)
+    digest.update(os.path.getsize(path).to_bytes(8, "little"))
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SharedCache:
+    # JSON value cache with TTL and a global byte budget (least recently used
+    # entries are evicted first). Safe across threads and processes.
+
+    def __init__(self, namespace: str, db_path: Optional[str] = None,
+                 max_bytes: int = CACHE_MAX_BYTES, ttl_sec: float = CACHE_TTL_SEC):
+        self.namespace = namespace
+        self.db_path = db_path or os.path.join(CACHE_DIR, "cache.db")
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        if not self._ready:
+            conn.executescript(_SCHEMA)
+            self._ready = True
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        if not CACHE_ENABLED:
+            return None
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT value, created_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl_sec:
+                    CACHE_REQUESTS.inc(cache=self.namespace, result="miss")
+                    return None
+                if now - row[2] > _TOUCH_INTERVAL_SEC:
+                    conn.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                                 (now, self.namespace, key))
+        except sqlite3.Error as e:
+            logger.warning("Cache read failed (%s): %s", self.namespace, e)
+            return None
+        CACHE_REQUESTS.inc(cache=self.namespace, result="hit")
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        if not CACHE_ENABLED:
+            return
+        encoded = json.dumps(value)
+        if len(encoded) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, key, encoded, len(encoded), now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning("Cache write failed (%s): %s", self.namespace, e)
+
+    def claim(self, key: str, ttl_sec: float) -> bool:
+        # Lease on computing `key`, so other processes wait for the result instead of
+        # repeating the work. True if this caller holds it (or the cache is off/broken).
+        if not CACHE_ENABLED:
+            return True
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM leases WHERE namespace = ? AND key = ? AND expires_at < ?",
+                             (self.namespace, key, now))
+                conn.execute("INSERT OR IGNORE INTO leases (namespace, key, expires_at) VALUES (?, ?, ?)",
+                             (self.namespace, key, now + ttl_sec))
+                return conn.execute("SELECT changes()").fetchone()[0] == 1
+        except sqlite3.Error as e:
+            logger.warning("Cache lease failed (%s): %s", self.namespace, e)
+            return True
+
+    def leased(self, key: str) -> bool:
+        if not CACHE_ENABLED:
+            return False
+        try:
+            with closing(self._connect()) as conn:
+                return conn.execute("SELECT 1 FROM leases WHERE namespace = ? AND key = ? AND expires_at >= ?",
+                                    (self.namespace, key, time.time())).fetchone() is not None
+        except sqlite3.Error as e:
+            logger.warning("Cache lease check failed (%s): %s", self.namespace, e)
+            return False
+
+    def release(self, key: str):
+        if not CACHE_ENABLED:
+            return
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("DELETE FROM leases WHERE namespace = ? AND key = ?", (self.namespace, key))
+        except sqlite3.Error as e:
+            logger.warning("Cache lease release failed (%s): %s", self.namespace, e)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_sec,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so we don't evict on every insert
+        excess = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for namespace, key, size in conn.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at"):
+            victims.append((namespace, key))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+
+
+# Extraction results keyed by upload content, judgements keyed by the full request
+frame_cache = SharedCache("frames")
+result_cache = SharedCache("judgements")
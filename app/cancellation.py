@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncIterator
+
+from app.metrics import Counter
+from app.logging_utils import get_logger
+
+logger = get_logger("cancellation")
+
+# ------------------------
+# Request cancellation (client disconnects + deadlines)
+# ------------------------
+# A CancelToken is shared between the event loop, which cancels it when the client
+# goes away or the deadline passes, and the worker thread doing the work, which
+# checks it between frames / LLM chunks and stops early.
+EXTRACT_DEADLINE_SEC = float(os.getenv("EXTRACT_DEADLINE_SEC", "120"))
+JUDGE_DEADLINE_SEC = float(os.getenv("JUDGE_DEADLINE_SEC", "180"))
+DISCONNECT_POLL_SEC = 0.5
+
+CANCELLED_REQUESTS = Counter("synchro_cancelled_requests_total",
+                             "Requests whose work was stopped early.", ("endpoint", "reason"))
+FRAMES_NOT_DECODED = Counter("synchro_cancelled_frames_not_decoded_total",
+                             "Video frames left undecoded because their request was cancelled.")
+LLM_CALLS_CANCELLED = Counter("synchro_llm_calls_cancelled_total",
+                              "LLM calls skipped or cut short because their request was cancelled.", ("stage",))
+
+
+class RequestCancelled(Exception):
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+
+    def __init__(self, deadline_sec: float = 0.0):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = time.monotonic() + deadline_sec if deadline_sec > 0 else None
+
+    def cancel(self, reason: str):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() > self.deadline:
+            self.cancel("deadline")
+        return self._event.is_set()
+
+    def check(self):
+        # Raises RequestCancelled once the request is cancelled; cheap enough to call per frame
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+def check_cancelled(cancel: Optional[CancelToken]):
+    if cancel is not None:
+        cancel.check()
+
+
+async def _watch_disconnect(request, token: CancelToken):
+    # Once the body is read the next ASGI message is http.disconnect. Wait on it
+    # directly: request.is_disconnected() only peeks without waiting, which never
+    # gets through the @app.middleware("http") layers to the server.
+    while not token.cancelled:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            token.cancel("client_disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SEC)
+
+
+@asynccontextmanager
+async def cancel_scope(request, deadline_sec: float = 0.0,
+                       token: Optional[CancelToken] = None) -> AsyncIterator[CancelToken]:
+    # Token cancelled when the client disconnects or after `deadline_sec` (0 = none);
+    # pass `token` to watch an existing one. Only enter once the request body has
+    # been read: the watcher consumes receive().
+    token = token or CancelToken(deadline_sec)
+    watcher = asyncio.ensure_future(_watch_disconnect(request, token))
+    try:
+        yield token
+    finally:
+        watcher.cancel()
+
+
+def cancelled_status(reason: str) -> int:
+    # 504 for a missed deadline; 499 (client closed request) when nobody is listening
+    return 504 if reason == "deadline" else 499
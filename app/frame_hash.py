@@ -0,0 +1,73 @@
+import os
+from typing import List, Any, Dict
+
+from app.startup import lazy_import
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# ------------------------
+# Near-duplicate detection (perceptual hashes)
+# ------------------------
+# Two 64-bit hashes per frame: dHash (sign of horizontal gradients on a 9x8
+# thumbnail) and pHash (signs of the 8x8 lowest DCT frequencies of a 32x32
+# thumbnail). Frames within both Hamming thresholds are treated as the same
+# picture, e.g. several frames of a held vertical. The hashes cover the whole
+# frame, where a small swimmer moving across the same pool changes only a few
+# bits (dHash as few as 2, pHash about 10): keep the thresholds tight.
+DEDUP_ENABLED = os.getenv("DEDUP_FRAMES", "1") != "0"
+DHASH_THRESHOLD = int(os.getenv("DHASH_THRESHOLD", "4"))
+PHASH_THRESHOLD = int(os.getenv("PHASH_THRESHOLD", "4"))
+_PHASH_SIZE = 32
+
+
+def hash_settings() -> Dict[str, Any]:
+    # Everything that changes which frames are dropped; part of the cache keys
+    return {"enabled": DEDUP_ENABLED, "dhash": DHASH_THRESHOLD, "phash": PHASH_THRESHOLD}
+
+
+def _dct_matrix(size: int):
+    # Orthonormal DCT-II basis, so pHash needs only two matrix products per frame
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+
+def _gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def frame_hashes(images: List[Any]):
+    # (dhash, phash) as two (N, 64) boolean arrays
+    dct = _dct_matrix(_PHASH_SIZE)
+    small = np.stack([cv2.resize(_gray(image), (9, 8), interpolation=cv2.INTER_AREA)
+                      for image in images]).astype(np.float32)
+    dhash = (small[:, :, 1:] > small[:, :, :-1]).reshape(len(images), -1)
+
+    thumbs = np.stack([cv2.resize(_gray(image), (_PHASH_SIZE, _PHASH_SIZE), interpolation=cv2.INTER_AREA)
+                       for image in images]).astype(np.float32)
+    low = (dct @ thumbs @ dct.T)[:, :8, :8].reshape(len(images), -1)
+    # The DC term only carries brightness; compare against the median of the rest
+    phash = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    return dhash, phash
+
+
+def unique_indices(images: List[Any], order: List[int] = None) -> List[int]:
+    # Greedy clustering: walk the frames in `order` (most preferred first, default
+    # as given) and keep a frame unless it's a near-duplicate of one already kept.
+    # Returns the kept indices in walk order.
+    order = list(range(len(images))) if order is None else list(order)
+    if not DEDUP_ENABLED or len(order) < 2:
+        return order
+    dhash, phash = frame_hashes(images)
+    d_dist = (dhash[:, None, :] != dhash[None, :, :]).sum(axis=2)
+    p_dist = (phash[:, None, :] != phash[None, :, :]).sum(axis=2)
+    duplicate = (d_dist <= DHASH_THRESHOLD) & (p_dist <= PHASH_THRESHOLD)
+
+    kept: List[int] = []
+    for i in order:
+        if not any(duplicate[i, j] for j in kept):
+            kept.append(i)
+    return kept
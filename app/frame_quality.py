@@ -0,0 +1,91 @@
+import os
+from typing import List, Dict, Any, Optional
+
+from app.startup import lazy_import
+from app.measurements import WATER_HUE_MIN, WATER_HUE_MAX, WATER_SAT_MIN, WATER_VAL_MIN
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# ------------------------
+# Frame quality scoring
+# ------------------------
+# All candidate frames of a clip are scored in one pass over a stacked array of
+# small thumbnails: sharpness (Laplacian variance), exposure clipping, splash/foam
+# share of the water, and whether the camera is under water. Candidates are ranked
+# by score before anything is encoded or sent to the model.
+QUALITY_WIDTH = 320
+# Laplacian variance (at QUALITY_WIDTH) counted as fully sharp
+SHARPNESS_REF = float(os.getenv("SHARPNESS_REF", "150"))
+# Pixels at or beyond these gray levels count as clipped
+CLIP_LOW = 5
+CLIP_HIGH = 250
+# Frames above these fractions are rejected outright
+MAX_CLIPPED = float(os.getenv("MAX_CLIPPED", "0.3"))
+MAX_SPLASH = float(os.getenv("MAX_SPLASH", "0.5"))
+# Foam/splash: bright, nearly colourless pixels in rows where at least
+# WATER_ROW_MIN of the row is water
+FOAM_MAX_SAT = 40
+FOAM_MIN_VAL = 200
+WATER_ROW_MIN = 0.2
+# Under water, the top of the frame is water too
+UNDERWATER_TOP_WATER = 0.8
+
+
+def quality_settings() -> Dict[str, Any]:
+    # Everything that changes scores or selection; part of the frame cache key
+    return {"width": QUALITY_WIDTH, "detail": "full_size", "sharpness_ref": SHARPNESS_REF, "max_clipped": MAX_CLIPPED,
+            "max_splash": MAX_SPLASH, "foam": [FOAM_MAX_SAT, FOAM_MIN_VAL, WATER_ROW_MIN]}
+
+
+def _thumbnails(frames: List[Any]):
+    # (N, H, W, 3) uint8 stack; every thumbnail gets the first one's size
+    height, width = frames[0].shape[:2]
+    size = (QUALITY_WIDTH, max(8, round(height * QUALITY_WIDTH / width)))
+    return np.stack([cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in frames])
+
+
+def score_frames(frames: List[Any], min_detail_std: float = 0.0,
+                 detail: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+    # One dict per frame: score (0-1, higher is better), its components, the
+    # detected view ("surface"/"underwater") and whether the frame is usable at all.
+    # `detail` is each frame's grayscale std, the blank-frame measure gated by
+    # `min_detail_std`; callers that downscaled the frames pass it from the
+    # originals. It is never taken from the thumbnails, which are too smooth.
+    if not frames:
+        return []
+    if detail is None:
+        detail = [float(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).std()) for frame in frames]
+    detail = np.asarray(detail, dtype=np.float32)
+    stack = _thumbnails(frames)
+    count, height, width = stack.shape[:3]
+    # cvtColor on the frames laid out as one tall image converts them all at once
+    tall = stack.reshape(count * height, width, 3)
+    gray = cv2.cvtColor(tall, cv2.COLOR_BGR2GRAY).reshape(count, height, width).astype(np.float32)
+    hsv = cv2.cvtColor(tall, cv2.COLOR_BGR2HSV)
+
+    laplacian = (4 * gray[:, 1:-1, 1:-1] - gray[:, :-2, 1:-1] - gray[:, 2:, 1:-1]
+                 - gray[:, 1:-1, :-2] - gray[:, 1:-1, 2:])
+    sharpness = laplacian.reshape(count, -1).var(axis=1)
+    clipped = ((gray <= CLIP_LOW) | (gray >= CLIP_HIGH)).reshape(count, -1).mean(axis=1)
+
+    water = cv2.inRange(hsv, (WATER_HUE_MIN, WATER_SAT_MIN, WATER_VAL_MIN), (WATER_HUE_MAX, 255, 255))
+    foam = (cv2.inRange(hsv, (0, 0, FOAM_MIN_VAL), (180, FOAM_MAX_SAT, 255)) > 0).reshape(count, height, width)
+    water = (water > 0).reshape(count, height, width)
+    # Only rows that show the pool count, so a white wall or sky above it isn't "foam"
+    foam &= (water.mean(axis=2) >= WATER_ROW_MIN)[:, :, None]
+    water_px = water.reshape(count, -1).sum(axis=1)
+    foam_px = foam.reshape(count, -1).sum(axis=1)
+    splash = np.where(water_px + foam_px > 0, foam_px / np.maximum(water_px + foam_px, 1), 0.0)
+    underwater = water[:, :max(1, height // 4)].reshape(count, -1).mean(axis=1) >= UNDERWATER_TOP_WATER
+
+    score = np.minimum(1.0, sharpness / SHARPNESS_REF) * (1 - clipped) * (1 - splash)
+    usable = (detail >= min_detail_std) & (clipped <= MAX_CLIPPED) & (splash <= MAX_SPLASH)
+    return [{
+        "score": round(float(score[i]), 3),
+        "sharpness": round(float(sharpness[i]), 1),
+        "clipped": round(float(clipped[i]), 3),
+        "splash": round(float(splash[i]), 3),
+        "view": "underwater" if underwater[i] else "surface",
+        "usable": bool(usable[i]),
+    } for i in range(count)]
@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import base64
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
+
+# ------------------------
+# History store config
+# ------------------------
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join("data", "history.db"))
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") != "0"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS judgements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    athlete TEXT NOT NULL DEFAULT '',
+    figure_name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    score REAL,                    -- parsed from the score summary, NULL if not found
+    num_frames INTEGER NOT NULL,
+    observations TEXT NOT NULL DEFAULT '',
+    llm_output TEXT NOT NULL
+);
+-- Every listing is ordered by (created_at, id), so each filter column gets a
+-- composite index ending in those two columns for index-only range scans.
+CREATE INDEX IF NOT EXISTS idx_judgements_created ON judgements (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_judgements_athlete ON judgements (athlete, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_judgements_figure ON judgements (figure_name, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_judgements_model ON judgements (model, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_judgements_athlete_figure ON judgements (athlete, figure_name, created_at, id);
+"""
+
+# "Total Score: 7.4", "Final score - 7.4/10", "**Score:** 7.4 / 10"
+_SCORE_PATTERNS = [
+    re.compile(r"score[^0-9\n]{0,30}(\d{1,2}(?:\.\d+)?)\s*(?:/\s*10)?", re.IGNORECASE),
+    re.compile(r"(\d{1,2}(?:\.\d+)?)\s*/\s*10\b"),
+]
+
+# Columns returned by listings (llm_output is only returned for single records)
+_SUMMARY_COLUMNS = "id, created_at, athlete, figure_name, model, score, num_frames, observations"
+
+
+def parse_score(llm_output: str) -> Optional[float]:
+    for pattern in _SCORE_PATTERNS:
+        match = pattern.search(llm_output)
+        if match:
+            value = float(match.group(1))
+            if 0 <= value <= 10:
+                return value
+    return None
+
+
+class HistoryStore:
+    # Same connection-per-call pattern as the job store, so it is safe to use
+    # from request threads and worker processes alike.
+
+    def __init__(self, db_path: str = HISTORY_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, athlete: str, figure_name: str, model: str, observations: str,
+            num_frames: int, llm_output: str, created_at: Optional[float] = None) -> int:
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                "INSERT INTO judgements (created_at, athlete, figure_name, model, score, num_frames, observations, llm_output) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (created_at or time.time(), athlete.strip(), figure_name, model, parse_score(llm_output),
+                 num_frames, observations, llm_output),
+            )
+            return cur.lastrowid
+
+    def get(self, judgement_id: int) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM judgements WHERE id = ?", (judgement_id,)).fetchone()
+        return _format(dict(row)) if row else None
+
+    def query(self, athlete: Optional[str] = None, figure_name: Optional[str] = None,
+              model: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+              newest_first: bool = True, columns: str = _SUMMARY_COLUMNS) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Keyset pagination on (created_at, id): pages stay fast however deep the
+        # client scrolls, and new inserts never shift already-served pages.
+        where, args = [], []
+        for column, value in (("athlete", athlete), ("figure_name", figure_name), ("model", model)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        if cursor:
+            after_ts, after_id = _decode_cursor(cursor)
+            op = "<" if newest_first else ">"
+            where.append(f"(created_at, id) {op} (?, ?)")
+            args.extend([after_ts, after_id])
+
+        order = "DESC" if newest_first else "ASC"
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sql = f"SELECT {columns} FROM judgements"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY created_at {order}, id {order} LIMIT ?"
+        args.append(limit + 1)
+
+        with closing(self._connect()) as conn:
+            rows = [dict(r) for r in conn.execute(sql, args).fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+        return [_format(r) for r in rows], next_cursor
+
+
+def _format(row: Dict[str, Any]) -> Dict[str, Any]:
+    row["created_at_iso"] = datetime.fromtimestamp(row["created_at"], tz=timezone.utc).isoformat()
+    return row
+
+
+def _encode_cursor(created_at: float, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}:{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+
+def parse_date(value: Optional[str]) -> Optional[float]:
+    # Accepts an ISO date/datetime (UTC if no offset is given) or "@<unix seconds>".
+    # A bare number is refused: 20240101 could be a compact ISO date or a 1970 timestamp
+    if not value:
+        return None
+    if value.startswith("@"):
+        try:
+            return float(value[1:])
+        except ValueError:
+            raise ValueError(f"Invalid unix timestamp: {value}")
+    try:
+        float(value)
+    except ValueError:
+        pass
+    else:
+        raise ValueError(f"Ambiguous date: {value}. Use an ISO date (2024-01-01) or @<unix seconds>.")
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+_store = None
+
+
+def get_history_store() -> HistoryStore:
+    global _store
+    if _store is None:
+        _store = HistoryStore()
+    return _store
+
+
+def record_judgement(**fields) -> Optional[int]:
+    if not HISTORY_ENABLED:
+        return None
+    return get_history_store().add(**fields)
@@ -0,0 +1,73 @@
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app.history import get_history_store, parse_date, DEFAULT_PAGE_SIZE
+
+router = APIRouter(prefix="/history")
+
+
+def _filters(since: Optional[str], until: Optional[str]):
+    return parse_date(since), parse_date(until)
+
+
+# ------------------------
+# Paginated listing
+# ------------------------
+@router.get("")
+async def list_judgements(
+    athlete: Optional[str] = None,
+    figure: Optional[str] = None,
+    model: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    order: str = "desc",
+):
+    try:
+        since_ts, until_ts = _filters(since, until)
+        items, next_cursor = await run_in_threadpool(
+            get_history_store().query,
+            athlete=athlete, figure_name=figure, model=model, since=since_ts, until=until_ts,
+            limit=limit, cursor=cursor, newest_first=(order != "asc"),
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# ------------------------
+# Trend view: an athlete's scores over time
+# ------------------------
+@router.get("/athletes/{athlete}/scores")
+async def athlete_scores(
+    athlete: str,
+    figure: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 500,
+    cursor: Optional[str] = None,
+):
+    # Oldest first and only the columns a chart needs, served from the athlete index
+    try:
+        since_ts, until_ts = _filters(since, until)
+        items, next_cursor = await run_in_threadpool(
+            get_history_store().query,
+            athlete=athlete, figure_name=figure, since=since_ts, until=until_ts,
+            limit=limit, cursor=cursor, newest_first=False,
+            columns="id, created_at, figure_name, model, score",
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    return {"athlete": athlete, "scores": items, "next_cursor": next_cursor}
+
+
+@router.get("/{judgement_id}")
+async def get_judgement(judgement_id: int):
+    item = await run_in_threadpool(get_history_store().get, judgement_id)
+    if item is None:
+        return JSONResponse(status_code=404, content={"message": "Judgement not found."})
+    return item
@@ -0,0 +1,99 @@
+import os
+import json
+import uuid
+import shutil
+from typing import BinaryIO, List, Optional
+
+from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app.jobs import JobStore, JOB_INPUT_DIR, public_status
+from app.video_utils import encode_settings
+
+router = APIRouter(prefix="/jobs")
+
+_store = None
+
+
+def get_store() -> JobStore:
+    # Created lazily so importing the router never touches the disk
+    global _store
+    if _store is None:
+        _store = JobStore()
+        os.makedirs(JOB_INPUT_DIR, exist_ok=True)
+    return _store
+
+
+# ------------------------
+# Submit
+# ------------------------
+def _save_input(source: BinaryIO, path: str):
+    # Runs in the threadpool: copying a large upload would stall the event loop
+    source.seek(0)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f, 1024 * 1024)
+
+
+@router.post("/extract_frames", status_code=202)
+async def submit_extract_frames(video: UploadFile = File(...), image_format: Optional[str] = None,
+                                quality: Optional[int] = None, max_frame_bytes: Optional[int] = None,
+                                max_total_bytes: Optional[int] = None):
+    try:
+        encoding = encode_settings(image_format, quality, max_frame_bytes, max_total_bytes)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"frames": [], "message": str(e)})
+    store = get_store()
+    # Inputs live in the job directory (not /tmp) so queued jobs survive a restart
+    input_path = os.path.join(JOB_INPUT_DIR, f"{uuid.uuid4().hex}.mp4")
+    await run_in_threadpool(_save_input, video.file, input_path)
+
+    job_id = await run_in_threadpool(store.submit, "extract_frames", {"filename": video.filename, "encoding": encoding}, input_path)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.post("/judge_base64_frames", status_code=202)
+async def submit_judge_frames(
+    figure_name: str = Form(...),
+    observations: str = Form(""),
+    frame_base64_json: str = Form(...),
+    athlete: str = Form("")
+):
+    # Rejected here, not as a failed job (or a 500) later
+    try:
+        frame_base64_list: List[str] = json.loads(frame_base64_json)
+        if not isinstance(frame_base64_list, list) or not all(isinstance(f, str) for f in frame_base64_list):
+            raise ValueError("expected a JSON array of base64 strings")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"llm_output": f"Error: Invalid frame_base64_json: {e}"})
+    if not frame_base64_list:
+        return JSONResponse(status_code=400, content={"llm_output": "Error: No frames were processed for the model."})
+
+    params = {"figure_name": figure_name, "observations": observations, "frames": frame_base64_list,
+              "athlete": athlete}
+    job_id = await run_in_threadpool(get_store().submit, "judge_base64_frames", params)
+    return {"job_id": job_id, "status": "queued"}
+
+
+# ------------------------
+# Status & result
+# ------------------------
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    job = await run_in_threadpool(get_store().get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found."})
+    return public_status(job)
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    job = await run_in_threadpool(get_store().get, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found."})
+    if job["status"] == "failed":
+        return JSONResponse(status_code=500, content={**public_status(job), "message": job["error"]})
+    if job["status"] != "succeeded":
+        # Not ready yet: same body as the status endpoint, with a polling hint
+        return JSONResponse(status_code=202, content=public_status(job), headers={"Retry-After": "2"})
+    return job["result"]
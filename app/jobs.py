@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from contextlib import closing
+from typing import Dict, Any, Optional
+
+# ------------------------
+# Job store config
+# ------------------------
+JOBS_DIR = os.getenv("JOBS_DIR", "jobs")
+JOBS_DB_PATH = os.path.join(JOBS_DIR, "jobs.db")
+JOB_INPUT_DIR = os.path.join(JOBS_DIR, "inputs")
+# A running job whose worker hasn't sent a heartbeat for this long is requeued
+JOB_STALE_SEC = float(os.getenv("JOB_STALE_SEC", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and any input files left behind) are deleted after this long
+JOB_TTL_SEC = float(os.getenv("JOB_TTL_SEC", str(24 * 3600)))
+
+JOB_KINDS = ("extract_frames", "judge_base64_frames")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,          -- queued | running | succeeded | failed
+    params TEXT NOT NULL,          -- JSON
+    input_path TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,                   -- JSON, set when succeeded
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    # SQLite-backed job table shared by the web process and the worker pool.
+    # Every call opens its own connection so the store is safe to use from
+    # threads and from separate processes.
+
+    def __init__(self, db_path: str = JOBS_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def submit(self, kind: str, params: Dict[str, Any], input_path: Optional[str] = None) -> str:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, input_path, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(params), input_path, time.time()),
+            )
+        # After the insert, so this job's input (maybe an old upload's file) counts as needed
+        self.expire()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def claim_next(self, worker: str) -> Optional[Dict[str, Any]]:
+        # BEGIN IMMEDIATE takes the write lock, so two workers can never claim the same job
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ?, message = 'Started' WHERE id = ?",
+                (worker, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        job = _row_to_job(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        return job
+
+    def update_progress(self, job_id: str, progress: float, message: Optional[str] = None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (round(progress, 4), message, time.time(), job_id),
+            )
+
+    def heartbeat(self, job_id: str):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', progress = 1, message = 'Done', result = ?, "
+                "finished_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', message = 'Failed', error = ?, finished_at = ? WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def requeue_stale(self, stale_sec: float = JOB_STALE_SEC) -> int:
+        # Recovers jobs whose worker died (e.g. after a restart). Jobs that have
+        # already used up their attempts are failed instead of retried forever.
+        cutoff = time.time() - stale_sec
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', message = 'Failed', error = 'Worker stopped responding', "
+                "finished_at = ? WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                (time.time(), cutoff, JOB_MAX_ATTEMPTS),
+            )
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', message = 'Requeued', worker = NULL "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (cutoff,),
+            )
+            return cur.rowcount
+
+    def expire(self, ttl_sec: float = JOB_TTL_SEC, input_dir: str = JOB_INPUT_DIR):
+        # Deletes jobs that finished more than `ttl_sec` ago, then input files as old
+        # that no queued or running job needs (e.g. left by a worker that died)
+        cutoff = time.time() - ttl_sec
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (cutoff,))
+            pending = {row["input_path"] for row in conn.execute(
+                "SELECT input_path FROM jobs WHERE status IN ('queued', 'running') AND input_path IS NOT NULL")}
+        if not os.path.isdir(input_dir):
+            return
+        for name in os.listdir(input_dir):
+            path = os.path.join(input_dir, name)
+            try:
+                if path not in pending and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def public_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    # What the status endpoint exposes (no params, paths or results)
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "error": job["error"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
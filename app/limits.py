@@ -0,0 +1,187 @@
+import os
+import re
+import math
+import time
+import random
+import sqlite3
+import hashlib
+from contextlib import closing
+from typing import Optional
+
+from app.cache import CACHE_DIR
+from app.metrics import Counter
+from app.logging_utils import get_logger
+
+logger = get_logger("limits")
+
+# ------------------------
+# Request limits config
+# ------------------------
+# Largest video accepted by any upload endpoint (/analyze takes two); 0 = unlimited
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+# Checked from container metadata before decoding; 0 = unlimited
+MAX_VIDEO_DURATION_SEC = float(os.getenv("MAX_VIDEO_DURATION_SEC", "600"))
+MAX_VIDEO_PIXELS = int(os.getenv("MAX_VIDEO_PIXELS", str(3840 * 2160)))
+
+# Token buckets per client: RATE_LIMIT_<NAME>_PER_MIN requests per minute on
+# average, bursts of up to RATE_LIMIT_<NAME>_BURST. A rate of 0 disables the bucket.
+RATE_LIMITS = {
+    "extract": (float(os.getenv("RATE_LIMIT_EXTRACT_PER_MIN", "10")), float(os.getenv("RATE_LIMIT_EXTRACT_BURST", "5"))),
+    "judge": (float(os.getenv("RATE_LIMIT_JUDGE_PER_MIN", "6")), float(os.getenv("RATE_LIMIT_JUDGE_BURST", "3"))),
+}
+# Clients sending one of these in X-API-Key get their own bucket instead of their IP's
+API_KEYS = {key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()}
+# Behind a reverse proxy (Render, nginx...) the client address is the last
+# X-Forwarded-For hop; only enable when such a proxy always sets the header
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0") != "0"
+# Buckets are shared by every web worker through one SQLite file next to the cache
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(CACHE_DIR, "ratelimit.db"))
+# Buckets untouched this long are full again and can be forgotten
+_BUCKET_TTL_SEC = 3600.0
+
+LIMIT_REJECTIONS = Counter("synchro_limit_rejections_total", "Requests rejected by a limit.", ("limit",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT NOT NULL,
+    client TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, client)
+);
+"""
+
+# (method, path pattern) -> bucket name
+_LIMITED_ROUTES = [
+    ("POST", re.compile(r"^/extract_frames(/stream)?$"), "extract"),
+    ("POST", re.compile(r"^/jobs/extract_frames$"), "extract"),
+    ("POST", re.compile(r"^/uploads/[^/]+/finalize$"), "extract"),
+    ("POST", re.compile(r"^/judge_base64_frames$"), "judge"),
+    ("POST", re.compile(r"^/jobs/judge_base64_frames$"), "judge"),
+    ("POST", re.compile(r"^/analyze$"), "judge"),
+]
+# Routes whose body is a video upload, with how many videos they take
+_UPLOAD_ROUTES = [
+    (re.compile(r"^/extract_frames(/stream)?$"), 1),
+    (re.compile(r"^/jobs/extract_frames$"), 1),
+    (re.compile(r"^/analyze$"), 2),
+]
+
+
+
+class VideoTooLarge(ValueError):
+    pass
+
+
+def check_video(width: int, height: int, duration_sec: float):
+    # Raises VideoTooLarge for videos over the resolution or duration limit
+    if MAX_VIDEO_PIXELS and width * height > MAX_VIDEO_PIXELS:
+        LIMIT_REJECTIONS.inc(limit="resolution")
+        raise VideoTooLarge(f"Video resolution {width}x{height} is over the limit of {MAX_VIDEO_PIXELS} pixels.")
+    check_duration(duration_sec)
+
+
+def check_duration(duration_sec: float):
+    if MAX_VIDEO_DURATION_SEC and duration_sec > MAX_VIDEO_DURATION_SEC:
+        LIMIT_REJECTIONS.inc(limit="duration")
+        raise VideoTooLarge(f"Video is longer than the {MAX_VIDEO_DURATION_SEC:g} s limit; trim it to the figure.")
+
+
+def limited_route(method: str, path: str) -> Optional[str]:
+    # Bucket name of a limited route, whether or not its rate limit is enabled
+    for route_method, pattern, name in _LIMITED_ROUTES:
+        if method == route_method and pattern.match(path):
+            return name
+    return None
+
+
+def bucket_for(method: str, path: str) -> Optional[str]:
+    # Bucket to charge for this request, or None when the route isn't rate limited
+    name = limited_route(method, path)
+    return name if name and RATE_LIMITS[name][0] > 0 else None
+
+
+def upload_limit_for(method: str, path: str) -> int:
+    # Max request body bytes for upload routes (0 = not an upload route / unlimited)
+    if method != "POST" or not MAX_UPLOAD_BYTES:
+        return 0
+    for pattern, videos in _UPLOAD_ROUTES:
+        if pattern.match(path):
+            # Room for the multipart framing and form fields
+            return videos * MAX_UPLOAD_BYTES + 64 * 1024
+    return 0
+
+
+def client_id(headers, client_host: Optional[str]) -> str:
+    api_key = headers.get("x-api-key")
+    if api_key and api_key in API_KEYS:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    if TRUST_FORWARDED_FOR and headers.get("x-forwarded-for"):
+        return "ip:" + headers["x-forwarded-for"].split(",")[-1].strip()
+    return "ip:" + (client_host or "unknown")
+
+
+class RateLimiter:
+    # Token buckets in SQLite: each take() refills the bucket for the time since
+    # the last request and spends one token, atomically across processes.
+    # Fails open (allows the request) if the database is unavailable.
+
+    def __init__(self, db_path: str = RATE_LIMIT_DB):
+        self.db_path = db_path
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        if not self._ready:
+            conn.executescript(_SCHEMA)
+            self._ready = True
+        return conn
+
+    def take(self, name: str, client: str) -> float:
+        # 0 if the request may go ahead, else the seconds until a token is available
+        per_min, burst = RATE_LIMITS[name]
+        rate = per_min / 60.0
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ? AND client = ?",
+                                       (name, client)).fetchone()
+                    tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                    retry_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                    if not retry_after:
+                        tokens -= 1
+                    conn.execute("INSERT OR REPLACE INTO buckets (name, client, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                                 (name, client, tokens, now))
+                    if random.random() < 0.01:
+                        conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - _BUCKET_TTL_SEC,))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.warning("Rate limiter unavailable, allowing request: %s", e)
+            return 0.0
+        if retry_after:
+            LIMIT_REJECTIONS.inc(limit=f"rate_{name}")
+        return retry_after
+
+
+rate_limiter = RateLimiter()
+
+
+def retry_after_header(seconds: float) -> str:
+    # Retry-After takes whole seconds; round up so the retry finds a token
+    return str(max(1, math.ceil(seconds)))
+
+
+def error_content(name: str, message: str) -> dict:
+    # Rejection body in the shape the limited endpoint normally answers with
+    if name == "judge":
+        return {"llm_output": f"Error: {message}"}
+    return {"frames": [], "message": message}
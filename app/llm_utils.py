@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import base64
+import threading
+from typing import List, Dict, Any, Optional
+
+from app.history import record_judgement
+from app.metrics import JUDGEMENTS_IN_FLIGHT, DUPLICATE_FRAMES, record_llm_call, timed
+from app.startup import lazy_import
+from app.cache import result_cache, content_key
+from app.logging_utils import get_logger
+from app.cancellation import RequestCancelled, LLM_CALLS_CANCELLED, check_cancelled
+from app.measurements import MEASUREMENTS_ENABLED, measurement_settings, measure_images, format_measurements
+
+logger = get_logger("llm")
+
+# --- GEMINI IMPORTS (deferred: google-genai takes ~0.5s to import) ---
+genai = lazy_import("google.genai")
+genai_types = lazy_import("google.genai.types")
+genai_errors = lazy_import("google.genai.errors")
+
+# ------------------------
+# Config
+# ------------------------
+# --- GEMINI CLIENT SETUP ---
+# Built on first use (or by the startup warm-up); tests and tools may assign their own client.
+client = None
+_client_initialized = False
+_client_lock = threading.Lock()
+
+
+def get_client() -> Optional[Any]:
+    global client, _client_initialized
+    if client is not None or _client_initialized:
+        return client
+    with _client_lock:
+        if not _client_initialized:
+            try:
+                # Use api_key from environment, or let it fail cleanly
+                api_key = os.getenv("GEMINI_API_KEY")
+                client = genai.Client(api_key=api_key)
+            except Exception as e:
+                logger.warning("Gemini client initialization failed. Is GEMINI_API_KEY set? Error: %s", e)
+                client = None
+            _client_initialized = True
+    return client
+
+
+MODEL_NAME = "gemini-2.5-flash"
+# Increased for complex HTML output and multiple image inputs
+MAX_OUTPUT_TOKENS = 8000
+GUIDELINES_PATH = "as_judging.json"
+
+# Shared output format for every judging prompt
+FORMAT_INSTRUCTIONS = (
+    "**CRITICAL INSTRUCTION: THE ENTIRE OUTPUT MUST BE FORMATTED EXACTLY LIKE THE EXAMPLE PROVIDED TO YOU. "
+    "The assessment MUST start with the score summary, followed by a single HTML <table> with the required six columns: "
+    "Transition, Max NVT, Max PV, Awarded PV, Awarded NVT, Key Observations. "
+    "Do NOT use Markdown tables. Only use the HTML <table> format.** "
+    "End the response with a 'Deductions' list and a 'What to Improve' list with numerical PV points."
+)
+
+
+def load_prompt_template() -> dict:
+    # Raises json.JSONDecodeError for a malformed file; callers turn that into a 500
+    try:
+        with open(GUIDELINES_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.warning("%s not found. Using default guidelines.", GUIDELINES_PATH)
+        return {"content": "Apply standard Artistic Swimming rules for technical execution and scoring."}
+
+
+def build_judging_prompt(figure_name: str, observations: str, num_images: int, prompt_template: dict,
+                         measurements: str = "") -> str:
+    return (
+        f"You are an expert Artistic Swimming judge. Analyze the sequence of {num_images} images for the figure: '{figure_name}'. "
+        f"Observations: '{observations}'. "
+        + (f"{measurements} " if measurements else "") +
+        "Calculate the score based on the three key transitions (T1, T2, T3) inherent in this figure. "
+        f"Reference the following judging guidelines: {prompt_template.get('content', 'No guidelines provided')}. "
+        + FORMAT_INSTRUCTIONS
+    )
+
+
+def build_comparison_prompt(figure_name: str, observations: str, pair_times: List[Any], prompt_template: dict,
+                            measurements: str = "") -> str:
+    pair_lines = " ".join(
+        f"Pair {i + 1}: Video 1 at {t1}s, Video 2 at {t2}s." for i, (t1, t2) in enumerate(pair_times)
+    )
+    return (
+        f"You are an expert Artistic Swimming judge comparing two videos of the figure: '{figure_name}'. "
+        f"Observations: '{observations}'. "
+        f"The images come in {len(pair_times)} time-matched pairs (Video 1 image first, then Video 2) after aligning both "
+        f"videos on motion onset. {pair_lines} "
+        + (f"{measurements} " if measurements else "") +
+        "Score each video separately based on the three key transitions (T1, T2, T3) inherent in this figure, "
+        "then state which video shows the better execution and why. "
+        f"Reference the following judging guidelines: {prompt_template.get('content', 'No guidelines provided')}. "
+        + FORMAT_INSTRUCTIONS.replace("a single HTML <table>", "one HTML <table> per video")
+    )
+
+
+def sniff_image_mime(image_bytes: bytes) -> str:
+    # Frames may arrive as JPEG, WebP or AVIF (see ENCODE_FORMAT); trust the bytes, not the client
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    return "image/jpeg"
+
+
+def image_part(image_bytes: bytes):
+    return genai_types.Part.from_bytes(data=image_bytes, mime_type=sniff_image_mime(image_bytes))
+
+
+def decode_base64_images(frame_base64_list: List[str]) -> List[bytes]:
+    images = []
+    for b64_data in frame_base64_list:
+        try:
+            images.append(base64.b64decode(b64_data))
+        except Exception as e:
+            # Skip corrupted Base64 or decoding errors
+            logger.warning("Error decoding Base64 image: %s", e)
+            continue
+    return images
+
+
+# How often a request waiting for the model's first chunk checks its CancelToken
+FIRST_CHUNK_POLL_SEC = 0.1
+
+
+def _stream_chunks(stream, cancel=None):
+    # Yields the stream's chunks. The first next() sends the request and waits out
+    # the model's time to first token (most of the call), so with a `cancel` token
+    # it runs in a helper thread raced against the token: a cancelled request
+    # raises RequestCancelled at once, and the helper closes the stream when the
+    # chunk finally arrives, which stops the generation there.
+    stream = iter(stream)
+    if cancel is None:
+        yield from stream
+        return
+    arrived = threading.Event()
+    lock = threading.Lock()
+    box: Dict[str, Any] = {"abandoned": False}
+
+    def fetch_first():
+        try:
+            box["chunk"] = next(stream, None)
+        except BaseException as e:
+            box["error"] = e
+        with lock:
+            arrived.set()
+            abandoned = box["abandoned"]
+        if abandoned:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    threading.Thread(target=fetch_first, name="llm-first-chunk", daemon=True).start()
+    while not arrived.wait(FIRST_CHUNK_POLL_SEC):
+        if cancel.cancelled:
+            with lock:
+                if not arrived.is_set():
+                    box["abandoned"] = True
+                    LLM_CALLS_CANCELLED.inc(stage="waiting")
+                    raise RequestCancelled(cancel.reason)
+    if "error" in box:
+        raise box["error"]
+    if box["chunk"] is None:
+        return
+    yield box["chunk"]
+    yield from stream
+
+
+def generate_judgement(contents: List[Any], timer=None, cancel=None) -> Dict[str, Any]:
+    # Always returns display text in "output_text"; API failures are reported in the
+    # text itself and flagged with ok=False so they aren't stored as judgements.
+    # The response is streamed so `timer` can split the call into "llm_wait"
+    # (time to first chunk) and "llm_generation" (the rest of the output).
+    # `cancel` (an app.cancellation.CancelToken) is checked before the call, while
+    # waiting for the first chunk and between chunks; a cancelled call closes the
+    # stream and raises RequestCancelled.
+    if cancel is not None and cancel.cancelled:
+        LLM_CALLS_CANCELLED.inc(stage="before_call")
+        raise RequestCancelled(cancel.reason)
+    client = get_client()
+    if not client:
+        return {"output_text": "Error: Gemini client not initialized. Check GEMINI_API_KEY.", "ok": False,
+                "finish_reason": None, "input_tokens": None, "output_tokens": None}
+
+    ok = False
+    finish_reason = None
+    input_tokens = output_tokens = None
+    try:
+        chunks: List[str] = []
+        with JUDGEMENTS_IN_FLIGHT.track():
+            start = time.perf_counter()
+            first_chunk_at = None
+            stream = client.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=contents,
+                config=genai_types.GenerateContentConfig(
+                    max_output_tokens=MAX_OUTPUT_TOKENS
+                )
+            )
+            for chunk in _stream_chunks(stream, cancel):
+                if cancel is not None and cancel.cancelled:
+                    # Dropping the connection stops the generation (and its billing)
+                    stream.close()
+                    LLM_CALLS_CANCELLED.inc(stage="streaming")
+                    raise RequestCancelled(cancel.reason)
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                if chunk.text:
+                    chunks.append(chunk.text)
+                if chunk.candidates and chunk.candidates[0].finish_reason:
+                    finish_reason = chunk.candidates[0].finish_reason.name
+                if chunk.usage_metadata:
+                    input_tokens = chunk.usage_metadata.prompt_token_count
+                    output_tokens = chunk.usage_metadata.candidates_token_count
+            end = time.perf_counter()
+        if timer is not None:
+            first_chunk_at = first_chunk_at or end
+            timer.add("llm_wait", first_chunk_at - start)
+            timer.add("llm_generation", end - first_chunk_at)
+
+        output_text = "".join(chunks)
+        finish_reason = finish_reason or "UNKNOWN"
+
+        if not output_text:
+            if finish_reason == 'SAFETY':
+                logger.warning("Gemini blocked the response due to safety filters.")
+                output_text = "## 🚨 Response Blocked by Safety Filters\n\nTry adjusting your prompt or selecting different frames."
+            else:
+                logger.warning("Gemini returned a blank response string.", extra={"finish_reason": finish_reason})
+                output_text = f"The AI returned a blank response (Reason: {finish_reason}). Check the server logs for details."
+        else:
+            ok = True
+            logger.info("Gemini API call successful.", extra={"output_chars": len(output_text), "input_tokens": input_tokens, "output_tokens": output_tokens})
+            logger.debug("LLM output preview: %s...", output_text[:100])
+
+    except RequestCancelled:
+        raise
+    except genai_errors.APIError as e:
+        output_text = f"Gemini API call failed (APIError). Status: {e.status_code}. Details: {e.message}"
+        logger.error("LLM API error: %s", e, extra={"status_code": e.status_code})
+    except Exception as e:
+        output_text = f"LLM call failed (General Exception): {type(e).__name__}: {e}"
+        logger.exception("LLM call failed: %s", e)
+
+    record_llm_call(MODEL_NAME, input_tokens, output_tokens, finish_reason)
+    return {"output_text": output_text, "ok": ok, "finish_reason": finish_reason,
+            "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+def judgement_key(figure_name: str, observations: str, frame_base64_list: List[str],
+                  prompt_template: Optional[dict] = None) -> str:
+    # Everything that determines the judgement; raises json.JSONDecodeError for bad guidelines
+    if prompt_template is None:
+        prompt_template = load_prompt_template()
+    return content_key("judge", MODEL_NAME, prompt_template, measurement_settings(),
+                       figure_name, observations, frame_base64_list)
+
+
+def save_judgement(athlete: str, figure_name: str, observations: str, num_frames: int,
+                   llm_output: str) -> Optional[int]:
+    # One history row per request, also when the answer came from the cache or
+    # another in-flight request, so every athlete's history is complete.
+    # History is best-effort: never lose the judgement because the store failed.
+    try:
+        return record_judgement(athlete=athlete, figure_name=figure_name, model=MODEL_NAME,
+                                observations=observations, num_frames=num_frames, llm_output=llm_output)
+    except Exception as e:
+        logger.warning("Could not save judgement to history: %s", e)
+        return None
+
+
+def with_history(result: Dict[str, Any], athlete: str) -> Dict[str, Any]:
+    # `result` (a shared judgement) saved for this request's athlete, with its own judgement_id
+    result = {key: value for key, value in result.items() if key != "judgement_id"}
+    judgement_id = save_judgement(athlete, result["figure_name"], result["observations"],
+                                  result["num_frames"], result["llm_output"])
+    if judgement_id is not None:
+        result["judgement_id"] = judgement_id
+    return result
+
+
+def run_judgement(figure_name: str, observations: str, frame_base64_list: List[str],
+                  athlete: str = "", timer=None, cancel=None) -> Dict[str, Any]:
+    # Full judging pipeline shared by the HTTP endpoint and the job workers.
+    # Raises json.JSONDecodeError for bad guidelines, ValueError for an empty frame
+    # list and RequestCancelled once `cancel` fires (nothing is stored then).
+    # Successful judgements, cached ones included, are saved to the history store.
+    # 1. Prepare text prompt and image data
+    with timed(timer, "prompt_build"):
+        prompt_template = load_prompt_template()
+
+    # Identical request already judged (by any worker)? Reuse it instead of paying again.
+    # The key leaves out the athlete: the same frames get the same judgement.
+    cache_key = judgement_key(figure_name, observations, frame_base64_list, prompt_template)
+    with timed(timer, "cache_lookup"):
+        cached = result_cache.get(cache_key)
+    if cached is not None:
+        return with_history({**cached, "cached": True}, athlete)
+
+    # 2. Convert Base64 strings back to binary images
+    with timed(timer, "base64_decode"):
+        images = decode_base64_images(frame_base64_list)
+
+    # These are the frames the user picked, so only byte-identical copies (a frame
+    # sent twice) are dropped; near-duplicates were already thinned out at extraction.
+    # The number dropped is reported in the response.
+    with timed(timer, "dedup"):
+        unique = list({image: None for image in images})
+    duplicates_dropped = len(images) - len(unique)
+    images = unique
+    DUPLICATE_FRAMES.inc(duplicates_dropped, stage="judge")
+
+    # 3. Measure body line/height on the CPU so the model gets numbers, not just pictures
+    check_cancelled(cancel)
+    measurements: List[Any] = []
+    if MEASUREMENTS_ENABLED:
+        with timed(timer, "measure"):
+            measurements = measure_images(images)
+
+    with timed(timer, "prompt_build"):
+        gemini_content: List[Any] = [
+            build_judging_prompt(figure_name, observations, len(images), prompt_template,
+                                 format_measurements(measurements))
+        ]
+        gemini_content.extend(image_part(image) for image in images)
+
+    files_processed = len(frame_base64_list)
+    logger.info("Sending frames to the model.", extra={"num_frames": len(images), "duplicates_dropped": duplicates_dropped,
+                                                       "model": MODEL_NAME})
+
+    if files_processed == 0:
+        raise ValueError("No frames were processed for the model.")
+
+    # --- GEMINI API Call & Response Handling ---
+    llm = generate_judgement(gemini_content, timer=timer, cancel=cancel)
+    result = {
+        "llm_output": llm["output_text"],
+        "num_frames": files_processed,
+        "figure_name": figure_name,
+        "observations": observations,
+        "measurements": measurements,
+        "duplicates_dropped": duplicates_dropped,
+    }
+
+    if llm["ok"]:
+        # Cached without a judgement_id: each reuse gets its own history row
+        result_cache.set(cache_key, result)
+        result = with_history(result, athlete)
+
+    return result
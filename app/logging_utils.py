@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.metrics import Counter
+
+# ------------------------
+# Logging config
+# ------------------------
+# Handlers only enqueue records; a single listener thread formats and writes them,
+# so a slow stdout (or log shipper) never stalls the event loop or a decode loop.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+# Bounded so a log storm can't grow memory; records beyond this are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+LOGS_DROPPED = Counter("synchro_log_records_dropped_total", "Log records dropped because the log queue was full.")
+
+# Set per request by the middleware in main.py; copied into threadpool calls by Starlette
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+_setup_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line; anything passed via `extra=` becomes a top-level field
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _RequestIdFilter(logging.Filter):
+    # Runs in the calling thread (before enqueueing), where the contextvar is set
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    # Never blocks the caller: a full queue drops the record instead of waiting
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGS_DROPPED.inc()
+
+
+def setup_logging():
+    # Idempotent; called at import time by main.py and at start-up by job workers
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        if LOG_FORMAT == "text":
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+        else:
+            stream.setFormatter(JsonFormatter())
+
+        handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        handler.addFilter(_RequestIdFilter())
+
+        root = logging.getLogger("synchro")
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(handler)
+        root.propagate = False
+
+        _listener = QueueListener(handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    # Module loggers live under "synchro." so LOG_LEVEL applies to all of them
+    return logging.getLogger(f"synchro.{name}")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
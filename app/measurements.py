@@ -0,0 +1,207 @@
+import os
+from typing import List, Dict, Any, Optional
+
+from app.startup import lazy_import
+from app.logging_utils import get_logger
+
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+logger = get_logger("measurements")
+
+# ------------------------
+# Body line measurement config
+# ------------------------
+# Each judged frame is segmented on the CPU (pool water by colour, the swimmer by
+# GrabCut seeded where the body breaks the surface) and the silhouette's principal
+# axis is fitted. The numbers go into the prompt so verticality, height and line
+# are anchored to measurements rather than read off the images alone.
+MEASUREMENTS_ENABLED = os.getenv("MEASUREMENTS", "1") != "0"
+# Frames are measured at this width; results are reported in original pixels
+MEASURE_WIDTH = 320
+# Pool water in OpenCV HSV (hue 0-180): blue/cyan with some saturation
+WATER_HUE_MIN = 80
+WATER_HUE_MAX = 130
+WATER_SAT_MIN = 50
+WATER_VAL_MIN = 40
+# A waterline needs mostly water below it and mostly not-water above it
+MIN_WATER_BELOW = 0.5
+MIN_WATERLINE_CONTRAST = 0.4
+# Silhouettes smaller than this fraction of the frame are treated as not found
+MIN_SILHOUETTE_FRACTION = 0.002
+GRABCUT_ITERATIONS = 3
+
+
+def measurement_settings() -> Dict[str, Any]:
+    # Everything that changes measurement output; part of the judgement cache key
+    return {"enabled": MEASUREMENTS_ENABLED, "width": MEASURE_WIDTH,
+            "water_hsv": [WATER_HUE_MIN, WATER_HUE_MAX, WATER_SAT_MIN, WATER_VAL_MIN],
+            "min_silhouette": MIN_SILHOUETTE_FRACTION, "grabcut_iterations": GRABCUT_ITERATIONS}
+
+
+def water_mask(small):
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, (WATER_HUE_MIN, WATER_SAT_MIN, WATER_VAL_MIN), (WATER_HUE_MAX, 255, 255))
+    kernel = np.ones((3, 3), np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel) > 0
+
+
+def find_waterline(water) -> Optional[int]:
+    # Row that best splits the frame into not-water above and water below (camera
+    # above the surface); None for underwater shots or frames without a pool
+    row_frac = water.mean(axis=1)
+    height = len(row_frac)
+    if height < 4:
+        return None
+    cumulative = np.concatenate(([0.0], np.cumsum(row_frac)))
+    rows = np.arange(1, height)
+    above = cumulative[rows] / rows
+    below = (cumulative[-1] - cumulative[rows]) / (height - rows)
+    contrast = below - above
+    best = int(np.argmax(contrast))
+    if below[best] < MIN_WATER_BELOW or contrast[best] < MIN_WATERLINE_CONTRAST:
+        return None
+    return int(rows[best])
+
+
+def _largest_run(flags) -> Optional[tuple]:
+    # (start, end) of the longest run of True values, end exclusive
+    best = None
+    start = None
+    for i, flag in enumerate(list(flags) + [False]):
+        if flag and start is None:
+            start = i
+        elif not flag and start is not None:
+            if best is None or i - start > best[1] - best[0]:
+                best = (start, i)
+            start = None
+    return best
+
+
+def segment_swimmer(small, water, waterline: Optional[int]):
+    # Boolean silhouette mask, or None when no swimmer can be separated
+    height, width = water.shape
+    if waterline is None:
+        # Underwater (or water-only) view: the body is what isn't water
+        if water.mean() < 0.5:
+            return None
+        candidate = (~water).astype(np.uint8)
+        seed = None
+    else:
+        # Columns where the surface band is interrupted are where the body crosses it
+        band = water[waterline:min(height, waterline + max(2, height // 30))]
+        crossing = _largest_run(band.mean(axis=0) < 0.5)
+        if crossing is None:
+            return None
+        x0, x1 = crossing
+        margin = max(2, (x1 - x0) * 2)
+
+        gc_mask = np.full((height, width), cv2.GC_PR_BGD, np.uint8)
+        gc_mask[water] = cv2.GC_BGD
+        gc_mask[:, :max(0, x0 - 2 * margin)] = cv2.GC_BGD
+        gc_mask[:, min(width, x1 + 2 * margin):] = cv2.GC_BGD
+        column_band = slice(max(0, x0 - margin), min(width, x1 + margin))
+        gc_mask[:, column_band][~water[:, column_band]] = cv2.GC_PR_FGD
+        gc_mask[max(0, waterline - 2):waterline, x0:x1] = cv2.GC_FGD
+        try:
+            # GrabCut seeds its colour models randomly; fix the seed so a frame always measures the same
+            cv2.setRNGSeed(0)
+            cv2.grabCut(small, gc_mask, None, np.zeros((1, 65), np.float64), np.zeros((1, 65), np.float64),
+                        GRABCUT_ITERATIONS, cv2.GC_INIT_WITH_MASK)
+        except cv2.error as e:
+            logger.debug("GrabCut failed: %s", e)
+            return None
+        candidate = ((gc_mask == cv2.GC_FGD) | (gc_mask == cv2.GC_PR_FGD)).astype(np.uint8)
+        seed = (max(0, waterline - 1), (x0 + x1) // 2)
+
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(candidate, connectivity=8)
+    if count < 2:
+        return None
+    if seed is not None and labels[seed] != 0:
+        label = labels[seed]
+    else:
+        label = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    silhouette = labels == label
+    if silhouette.mean() < MIN_SILHOUETTE_FRACTION:
+        return None
+    return silhouette
+
+
+def measure_frame(image) -> Optional[Dict[str, Any]]:
+    # Angle of the body's principal axis from vertical (positive = top leans to the
+    # image right), visible height above the waterline, extension length along the
+    # axis, and line deviation (RMS distance from the axis / extension). Lengths are
+    # in original image pixels; height_ratio is the share of the extension above water.
+    if image is None or image.ndim != 3:
+        return None
+    scale = min(1.0, MEASURE_WIDTH / image.shape[1])
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    water = water_mask(small)
+    waterline = find_waterline(water)
+    silhouette = segment_swimmer(small, water, waterline)
+    if silhouette is None:
+        return None
+
+    ys, xs = np.nonzero(silhouette)
+    points = np.stack([xs, ys], axis=1).astype(np.float64)
+    center = points.mean(axis=0)
+    centered = points - center
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(centered, rowvar=False))
+    axis = eigenvectors[:, int(np.argmax(eigenvalues))]
+    if axis[1] > 0:
+        axis = -axis  # point up the image
+    along = centered @ axis
+    across = centered @ np.array([-axis[1], axis[0]])
+    extension = float(along.max() - along.min()) or 1.0
+    angle = float(np.degrees(np.arctan2(axis[0], -axis[1])))
+
+    height_above = None
+    height_ratio = None
+    if waterline is not None:
+        height_above = max(0.0, float(waterline - ys.min()))
+        height_ratio = round(min(1.0, height_above / extension), 3)
+        height_above = round(height_above / scale, 1)
+    return {
+        "angle_from_vertical_deg": round(angle, 1),
+        "height_above_water_px": height_above,
+        "height_ratio": height_ratio,
+        "extension_px": round(extension / scale, 1),
+        "line_deviation": round(float(np.sqrt(np.mean(across ** 2))) / extension, 3),
+        "waterline_y": None if waterline is None else round(waterline / scale, 1),
+        "silhouette_fraction": round(float(silhouette.mean()), 4),
+    }
+
+
+def measure_images(image_bytes_list: List[bytes]) -> List[Optional[Dict[str, Any]]]:
+    # Frames OpenCV can't decode (e.g. AVIF on builds without it) get None
+    results = []
+    for image_bytes in image_bytes_list:
+        try:
+            image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+            results.append(measure_frame(image))
+        except Exception as e:
+            logger.warning("Frame measurement failed: %s", e)
+            results.append(None)
+    return results
+
+
+def format_measurements(measurements: List[Optional[Dict[str, Any]]], labels: Optional[List[str]] = None) -> str:
+    # Compact text for the prompt; one clause per image
+    lines = []
+    for i, m in enumerate(measurements):
+        label = labels[i] if labels else f"Image {i + 1}"
+        if m is None:
+            lines.append(f"{label}: not measurable.")
+            continue
+        angle = m["angle_from_vertical_deg"]
+        side = "right" if angle > 0 else "left"
+        line = f"{label}: axis {abs(angle)}° {side} of vertical"
+        if m["height_ratio"] is not None:
+            line += f", {round(m['height_ratio'] * 100)}% of body length above water"
+        line += f", line deviation {round(m['line_deviation'] * 100, 1)}% of length."
+        lines.append(line)
+    if not any(measurements):
+        return ""
+    return ("Automated silhouette measurements (approximate, from image segmentation; "
+            "trust the images where they disagree): " + " ".join(lines))
@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Tuple, List, Optional, Iterator
+
+# ------------------------
+# Minimal Prometheus-style metrics (text exposition format 0.0.4)
+# ------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BYTE_BUCKETS = (1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8)
+
+_lock = threading.Lock()
+_registry: List["_Metric"] = []
+
+# Multi-process mode: with METRICS_DIR set (app.serve sets it when it starts the
+# web workers) every process writes its metrics to METRICS_DIR/<pid>.json every
+# METRICS_FLUSH_SEC, and /metrics merges all of them. Whichever worker answers
+# a scrape then reports the whole server, so counters never jump backwards (the
+# other processes' share can lag by up to METRICS_FLUSH_SEC).
+METRICS_FLUSH_SEC = float(os.getenv("METRICS_FLUSH_SEC", "1"))
+_export_dir: Optional[str] = None
+_export_lock = threading.Lock()
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+    # How processes are combined in multi-process mode: "sum", "max", or "live"
+    # (sum over processes that are still running, for in-flight gauges)
+    aggregate = "sum"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), aggregate: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        if aggregate:
+            self.aggregate = aggregate
+        self._values: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def snapshot(self) -> List[list]:
+        with _lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, items=None) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self, items=None) -> List[str]:
+        lines = super().render()
+        if items is None:
+            with _lock:
+                items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+    aggregate = "live"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        # In-flight gauge: +1 while the block runs
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            entry = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def snapshot(self) -> List[list]:
+        with _lock:
+            return [[list(key), list(entry)] for key, entry in self._values.items()]
+
+    def render(self, items=None) -> List[str]:
+        lines = super().render()
+        if items is None:
+            with _lock:
+                items = [(k, list(v)) for k, v in self._values.items()]
+        for key, entry in items:
+            labels = _label_str(self.labels, key)
+            for bound, count in zip(self.buckets, entry):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {count:g}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {entry[-1]:g}")
+            lines.append(f"{self.name}_sum{labels} {entry[-2]}")
+            lines.append(f"{self.name}_count{labels} {entry[-1]:g}")
+        return lines
+
+
+def render_metrics() -> str:
+    if _export_dir:
+        return _render_merged()
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------
+# Multi-process export (one snapshot file per process)
+# ------------------------
+def start_metrics_export():
+    # Called once per process (web worker lifespan, job worker start); no-op
+    # unless METRICS_DIR is set
+    global _export_dir
+    directory = os.getenv("METRICS_DIR")
+    if not directory or _export_dir:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _export_dir = directory
+    atexit.register(_write_snapshot)
+    threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush").start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SEC)
+        record_peak_rss()
+        _write_snapshot()
+
+
+def _write_snapshot():
+    data = {metric.name: metric.snapshot() for metric in _registry}
+    path = os.path.join(_export_dir, f"{os.getpid()}.json")
+    # The flush thread and a scrape may both write; readers only ever see whole files
+    with _export_lock:
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(data, f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots() -> List[Tuple[bool, Dict[str, list]]]:
+    # (process still running, metrics) for every process that ever exported; this
+    # process's own values are written first so they are never stale
+    _write_snapshot()
+    snapshots = []
+    for name in os.listdir(_export_dir):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(_export_dir, name)) as f:
+                snapshots.append((_alive(int(name[:-5])), json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _render_merged() -> str:
+    snapshots = _read_snapshots()
+    lines: List[str] = []
+    for metric in _registry:
+        merged: Dict[Tuple[str, ...], object] = {}
+        for alive, data in snapshots:
+            if metric.aggregate == "live" and not alive:
+                continue
+            for key, value in data.get(metric.name, []):
+                key = tuple(key)
+                if key not in merged:
+                    merged[key] = value
+                elif isinstance(value, list):
+                    merged[key] = [a + b for a, b in zip(merged[key], value)]
+                elif metric.aggregate == "max":
+                    merged[key] = max(merged[key], value)
+                else:
+                    merged[key] += value
+        lines.extend(metric.render(list(merged.items())))
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------
+# Application metrics
+# ------------------------
+STAGE_SECONDS = Histogram(
+    "synchro_stage_duration_seconds", "Time spent in each request stage.", ("endpoint", "stage"))
+REQUEST_SECONDS = Histogram(
+    "synchro_request_duration_seconds", "End-to-end handler latency.", ("endpoint", "status"))
+FRAMES_DECODED = Counter("synchro_frames_decoded_total", "Video frames decoded during extraction.")
+FRAMES_KEPT = Counter("synchro_frames_kept_total", "Frames returned to the client after screening.")
+BYTES_IN = Counter("synchro_bytes_in_total", "Request payload bytes received.", ("endpoint",))
+BYTES_OUT = Counter("synchro_bytes_out_total", "Response payload bytes produced.", ("endpoint",))
+UPLOAD_BYTES = Histogram("synchro_upload_bytes", "Size of uploaded videos.", ("endpoint",), BYTE_BUCKETS)
+FRAME_BYTES = Histogram("synchro_frame_encoded_bytes", "Encoded size of returned frames.", ("mime_type",),
+                        (1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6))
+LLM_INPUT_TOKENS = Histogram("synchro_llm_input_tokens", "Prompt tokens per LLM call.", ("model",), TOKEN_BUCKETS)
+LLM_OUTPUT_TOKENS = Histogram("synchro_llm_output_tokens", "Output tokens per LLM call.", ("model",), TOKEN_BUCKETS)
+LLM_TOKENS = Counter("synchro_llm_tokens_total", "LLM tokens consumed.", ("model", "direction"))
+LLM_FINISH_REASONS = Counter("synchro_llm_finish_reason_total", "LLM calls by finish reason.", ("model", "reason"))
+DUPLICATE_FRAMES = Counter("synchro_duplicate_frames_dropped_total",
+                           "Near-duplicate frames dropped before encoding or judging.", ("stage",))
+EXTRACTION_BUFFER_BYTES = Histogram("synchro_extraction_buffer_bytes",
+                                    "Peak frame data held by one extraction.", (), BYTE_BUCKETS)
+PEAK_RSS_BYTES = Gauge("synchro_process_peak_rss_bytes", "Peak resident set size of the largest server process.",
+                       aggregate="max")
+EXTRACTIONS_IN_FLIGHT = Gauge("synchro_extractions_in_flight", "Frame extractions currently running.")
+JUDGEMENTS_IN_FLIGHT = Gauge("synchro_judgements_in_flight", "Judgements currently waiting on the LLM.")
+
+
+class StageTimer:
+    # Accumulates per-stage durations for one request. Stages entered several
+    # times (e.g. "decode" once per frame) are summed.
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        # Milliseconds per stage plus the total, for the optional `timings` response field
+        timings = {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        timings["total"] = round(self.total() * 1000, 2)
+        return timings
+
+    def server_timing(self) -> str:
+        # Server-Timing header value, e.g. "decode;dur=812.4, encode;dur=35.1, total;dur=901.0"
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+    def observe(self, status: int = 200):
+        # Publish everything collected so far to the aggregate histograms
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, stage=name)
+        REQUEST_SECONDS.observe(self.total(), endpoint=self.endpoint, status=str(status))
+
+
+def timed(timer: Optional[StageTimer], name: str):
+    # `with timed(timer, "decode"):` works whether or not the caller passed a timer
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+def record_peak_rss() -> int:
+    # High-water mark of the whole process (ru_maxrss is KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024
+    PEAK_RSS_BYTES.set(peak)
+    return peak
+
+
+def record_llm_call(model: str, input_tokens: Optional[int], output_tokens: Optional[int],
+                    finish_reason: Optional[str]):
+    if input_tokens is not None:
+        LLM_INPUT_TOKENS.observe(input_tokens, model=model)
+        LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+    if output_tokens is not None:
+        LLM_OUTPUT_TOKENS.observe(output_tokens, model=model)
+        LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+    LLM_FINISH_REASONS.inc(model=model, reason=finish_reason or "ERROR")
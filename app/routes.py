@@ -1,23 +1,118 @@
-from fastapi import APIRouter, UploadFile, File
-import os
+import asyncio
+import base64
+import json
+from typing import List, Any
 
-router = APIRouter()
+from fastapi import APIRouter, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from app import llm_utils
+from app.llm_utils import (
+    load_prompt_template,
+    build_comparison_prompt,
+    image_part,
+    generate_judgement,
+    save_judgement,
+)
+from app.upload_forms import VideoUploadRoute
+from app.measurements import MEASUREMENTS_ENABLED, measure_frame, format_measurements
+from app.video_utils import (
+    TARGET_FRAMES,
+    memory_file_path,
+    motion_profile,
+    estimate_offset,
+    matched_timestamps,
+    grab_frames_at,
+    encode_frames,
+)
+
+router = APIRouter(route_class=VideoUploadRoute)
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/analyze")
-async def analyze_videos(video1: UploadFile = File(...), video2: UploadFile = File(...)):
-    path1 = os.path.join(UPLOAD_DIR, video1.filename)
-    path2 = os.path.join(UPLOAD_DIR, video2.filename)
+async def analyze_videos(
+    video1: UploadFile = File(...),
+    video2: UploadFile = File(...),
+    figure_name: str = Form("Other"),
+    observations: str = Form(""),
+    num_pairs: int = Form(TARGET_FRAMES),
+    athlete: str = Form(""),
+):
+    if not await run_in_threadpool(llm_utils.get_client):
+        return JSONResponse(status_code=500, content={"llm_output": "Error: Gemini client not initialized. Check GEMINI_API_KEY."})
+
+    try:
+        prompt_template = await run_in_threadpool(load_prompt_template)
+    except json.JSONDecodeError as e:
+        return JSONResponse(status_code=500, content={"llm_output": f"Error: Invalid JSON in as_judging.json: {e}"})
+
+    # Both uploads were parsed straight into memory files (app.upload_forms)
+    path1, path2 = memory_file_path(video1.file), memory_file_path(video2.file)
+    # 1. Motion profiles for both videos are computed in parallel threads
+    try:
+        profile1, profile2 = await asyncio.gather(
+            run_in_threadpool(motion_profile, path1),
+            run_in_threadpool(motion_profile, path2),
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"llm_output": f"Error: {e}"})
+
+    # 2. Align timelines by cross-correlating the motion-onset envelopes
+    offset_sec, confidence = estimate_offset(profile1, profile2)
+    pair_times = matched_timestamps(
+        profile1["duration_sec"], profile2["duration_sec"], offset_sec, max(1, min(num_pairs, 12))
+    )
+
+    # 3. Grab the time-matched frames from both videos in parallel
+    frames1, frames2 = await asyncio.gather(
+        run_in_threadpool(grab_frames_at, path1, [t1 for t1, _ in pair_times]),
+        run_in_threadpool(grab_frames_at, path2, [t2 for _, t2 in pair_times]),
+    )
+
+    matched = [(t1, t2, f1, f2) for (t1, t2), f1, f2 in zip(pair_times, frames1, frames2)
+               if f1 is not None and f2 is not None]
+    # All frames of both videos are encoded together on the encoder threads
+    frames = [f for _, _, f1, f2 in matched for f in (f1, f2)]
+    encoded = await run_in_threadpool(encode_frames, frames)
+    measurements = [None] * len(frames)
+    if MEASUREMENTS_ENABLED:
+        measurements = await run_in_threadpool(lambda: [measure_frame(f) for f in frames])
+
+    pairs = []
+    gemini_content: List[Any] = []
+    for i, (t1, t2, _, _) in enumerate(matched):
+        data1, data2 = encoded[2 * i], encoded[2 * i + 1]
+        pairs.append({
+            "video1": {"timestamp_sec": t1, **data1, "measurements": measurements[2 * i]},
+            "video2": {"timestamp_sec": t2, **data2, "measurements": measurements[2 * i + 1]},
+        })
+        gemini_content.append(image_part(base64.b64decode(data1["base64_data"])))
+        gemini_content.append(image_part(base64.b64decode(data2["base64_data"])))
+
+    if not pairs:
+        return JSONResponse(status_code=400, content={"llm_output": "Error: The two videos have no overlapping section to compare."})
 
-    with open(path1, "wb") as f1:
-        f1.write(await video1.read())
-    with open(path2, "wb") as f2:
-        f2.write(await video2.read())
+    used_times = [(p["video1"]["timestamp_sec"], p["video2"]["timestamp_sec"]) for p in pairs]
+    labels = [f"Pair {i + 1} Video {v}" for i in range(len(pairs)) for v in (1, 2)]
+    gemini_content.insert(0, build_comparison_prompt(figure_name, observations, used_times, prompt_template,
+                                                     format_measurements(measurements, labels)))
 
-    # TODO: connect to your local LLM model here
-    score = "8.7 / 10"
-    comment = "Video 1 has smoother pacing; Video 2 has better lighting."
+    # 4. One comparative judgement from all pairs
+    llm = await run_in_threadpool(generate_judgement, gemini_content)
 
-    return {"score": score, "comment": comment}
\ No newline at end of file
+    result = {
+        "llm_output": llm["output_text"],
+        "figure_name": figure_name,
+        "observations": observations,
+        "offset_sec": round(offset_sec, 2),
+        "alignment_confidence": round(confidence, 3),
+        "pairs": pairs,
+    }
+    # Saved to the history like single-video judgements
+    if llm["ok"]:
+        judgement_id = await run_in_threadpool(save_judgement, athlete, figure_name, observations,
+                                               len(frames), llm["output_text"])
+        if judgement_id is not None:
+            result["judgement_id"] = judgement_id
+    return result
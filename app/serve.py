@@ -0,0 +1,88 @@
+import os
+import math
+import shutil
+import threading
+
+import uvicorn
+
+from app.cache import CACHE_DIR
+from app.worker import start_worker_pool, stop_worker_pool, supervise
+from app.logging_utils import setup_logging, get_logger, LOG_LEVEL
+
+logger = get_logger("serve")
+
+# ------------------------
+# Multi-worker launcher: python -m app.serve
+# ------------------------
+# WEB_CONCURRENCY overrides the derived worker count (same name uvicorn/gunicorn use)
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY")
+MAX_WEB_WORKERS = int(os.getenv("MAX_WEB_WORKERS", "8"))
+
+
+def available_cpus() -> float:
+    # Cores this container may actually use: affinity mask, capped by a cgroup quota
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+
+    try:
+        # cgroup v2: "max 100000" or "<quota> <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, int(quota) / int(period))
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if quota > 0:
+                cpus = min(cpus, quota / period)
+        except (OSError, ValueError):
+            pass
+    return cpus
+
+
+def web_worker_count() -> int:
+    if WEB_CONCURRENCY:
+        return max(1, int(WEB_CONCURRENCY))
+    # Extraction is CPU-bound and judging is I/O-bound, so one process per core
+    return max(1, min(MAX_WEB_WORKERS, math.floor(available_cpus())))
+
+
+def main():
+    setup_logging()
+    workers = web_worker_count()
+    job_workers = int(os.getenv("JOB_WORKERS", "0"))
+
+    # Every web and job worker exports its metrics here, so /metrics reports the
+    # whole server whichever worker answers; start from an empty directory
+    metrics_dir = os.environ.setdefault("METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    # The job pool lives in this parent process so N web workers don't start N pools
+    pool = None
+    if job_workers > 0:
+        pool = start_worker_pool(job_workers)
+        threading.Thread(target=supervise, args=(pool,), daemon=True).start()
+    os.environ["JOB_WORKERS"] = "0"
+
+    logger.info("Starting %s web worker(s) and %s job worker(s) on %g CPU(s).", workers, job_workers, available_cpus())
+    try:
+        uvicorn.run(
+            "main:app",
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=int(os.getenv("PORT", "8000")),
+            workers=workers,
+            log_level=LOG_LEVEL.lower(),
+        )
+    finally:
+        if pool:
+            stop_worker_pool(pool)
+
+
+if __name__ == "__main__":
+    main()
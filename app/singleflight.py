@@ -0,0 +1,102 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.cache import SharedCache, frame_cache, result_cache
+from app.cancellation import RequestCancelled
+from app.metrics import Counter
+from app.logging_utils import get_logger
+
+logger = get_logger("singleflight")
+
+# ------------------------
+# Single-flight request coalescing
+# ------------------------
+# Identical requests that arrive while the first one is still running wait for its
+# result instead of repeating the work. Within a web worker they share one
+# asyncio future; across workers the first one takes a lease in the shared cache
+# and the others poll the cache until its result lands there.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+# A leader that crashed stops blocking others after this long
+SINGLE_FLIGHT_LEASE_SEC = float(os.getenv("SINGLE_FLIGHT_LEASE_SEC", "300"))
+SINGLE_FLIGHT_POLL_SEC = 0.25
+
+COALESCED = Counter("synchro_coalesced_requests_total",
+                    "Requests served by another identical in-flight request.", ("flight", "scope"))
+
+
+class LeaderCancelled(Exception):
+    # The request doing the work went away (task cancelled, client disconnected or
+    # deadline passed); waiting requests try again themselves
+    pass
+
+
+class SingleFlight:
+
+    def __init__(self, name: str, cache: SharedCache):
+        self.name = name
+        self.cache = cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        # Returns (result, scope): scope is None when this call did the work, else
+        # "process" or "host" for a result shared from another request. `compute` is
+        # expected to store successful results in `self.cache` under `key`. Its
+        # exceptions reach every request waiting on it in this process.
+        if not SINGLE_FLIGHT_ENABLED:
+            return await compute(), None
+        while True:
+            future = self._inflight.get(key)
+            if future is not None:
+                try:
+                    result = await asyncio.shield(future)
+                except LeaderCancelled:
+                    continue
+                COALESCED.inc(flight=self.name, scope="process")
+                return result, "process"
+
+            future = asyncio.get_running_loop().create_future()
+            # Nobody may be waiting: don't log "exception was never retrieved"
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[key] = future
+            try:
+                shared = await self._wait_for_other_process(key)
+                if shared is not None:
+                    COALESCED.inc(flight=self.name, scope="host")
+                    future.set_result(shared)
+                    return shared, "host"
+                try:
+                    result = await compute()
+                finally:
+                    await run_in_threadpool(self.cache.release, key)
+            except (asyncio.CancelledError, RequestCancelled):
+                future.set_exception(LeaderCancelled())
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(result)
+                return result, None
+            finally:
+                del self._inflight[key]
+
+    async def _wait_for_other_process(self, key: str) -> Optional[Any]:
+        # Takes the lease and returns None (this request computes), or returns the
+        # result another process computed while holding it
+        while not await run_in_threadpool(self.cache.claim, key, SINGLE_FLIGHT_LEASE_SEC):
+            while await run_in_threadpool(self.cache.leased, key):
+                await asyncio.sleep(SINGLE_FLIGHT_POLL_SEC)
+            result = await run_in_threadpool(self.cache.get, key)
+            if result is not None:
+                return result
+            # The other process failed (nothing cached): compete for the lease again
+            logger.debug("Leader for %s finished without a result; retrying.", self.name)
+        return None
+
+
+# Extractions keyed like frame_cache, judgements keyed like result_cache
+frame_flight = SingleFlight("frames", frame_cache)
+judgement_flight = SingleFlight("judgements", result_cache)
@@ -0,0 +1,100 @@
+import os
+import time
+import types
+import importlib
+import threading
+from typing import Dict, Any, Optional
+
+from app.logging_utils import get_logger
+
+logger = get_logger("startup")
+
+# ------------------------
+# Startup config
+# ------------------------
+# "lazy": serve immediately and import cv2/numpy/google-genai in a background warm-up.
+# "eager": import everything before the app starts answering (old behaviour).
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+HEAVY_MODULES = ("numpy", "cv2", "google.genai")
+
+_import_lock = threading.RLock()
+
+# Readiness / cold-start bookkeeping, exposed by /readyz
+state: Dict[str, Any] = {
+    "ready": False,
+    "warmup_sec": None,
+    "warmup_error": None,
+    "first_response_sec": None,
+}
+
+
+class LazyModule(types.ModuleType):
+    # Stand-in for a heavy module: the real import happens on first attribute access
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = None
+
+    def _load(self) -> types.ModuleType:
+        target = self.__dict__["_lazy_target"]
+        if target is None:
+            with _import_lock:
+                target = self.__dict__["_lazy_target"]
+                if target is None:
+                    target = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_target"] = target
+        return target
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+# ------------------------
+# Warm-up & timing
+# ------------------------
+def process_age_sec() -> Optional[float]:
+    # Seconds since the OS started this process (Linux), so interpreter boot is included
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def warm_up():
+    # Imports the heavy modules and builds the Gemini client, then marks the app ready
+    from app import llm_utils
+
+    start = time.perf_counter()
+    try:
+        with _import_lock:
+            for name in HEAVY_MODULES:
+                importlib.import_module(name)
+        llm_utils.get_client()
+    except Exception as e:
+        state["warmup_error"] = f"{type(e).__name__}: {e}"
+        logger.warning("Warm-up failed: %s", state["warmup_error"])
+    state["warmup_sec"] = round(time.perf_counter() - start, 3)
+    state["ready"] = True
+    logger.info("Warm-up finished in %ss.", state["warmup_sec"])
+
+
+def start_warm_up():
+    if STARTUP_MODE == "eager":
+        warm_up()
+    else:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+def mark_first_response():
+    if state["first_response_sec"] is None:
+        age = process_age_sec()
+        state["first_response_sec"] = round(age, 3) if age is not None else None
+        logger.info("First response %ss after process start (mode: %s).", state["first_response_sec"], STARTUP_MODE)
@@ -0,0 +1,119 @@
+import os
+import re
+import gzip
+import hashlib
+from typing import Dict, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # optional: pages are still served gzip/identity without it
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Non-fingerprinted URLs may change content, so browsers must revalidate (cheap 304s)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+FINGERPRINT_LEN = 10
+
+_FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % FINGERPRINT_LEN)
+
+
+# ------------------------
+# Fingerprinted static assets
+# ------------------------
+class FingerprintedStaticFiles(StaticFiles):
+    # Serves "/static/<name>.<hash>.<ext>" as "<name>.<ext>" with a year-long
+    # immutable cache lifetime; plain URLs keep working but must revalidate.
+
+    def __init__(self, *args, url_prefix: str = "/static", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.url_prefix = url_prefix
+        self._hashes: Dict[str, Tuple[float, str]] = {}
+
+    def file_hash(self, rel_path: str) -> Optional[str]:
+        full_path = os.path.join(self.directory, rel_path)
+        try:
+            mtime = os.stat(full_path).st_mtime
+        except OSError:
+            return None
+        cached = self._hashes.get(rel_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        value = digest.hexdigest()[:FINGERPRINT_LEN]
+        self._hashes[rel_path] = (mtime, value)
+        return value
+
+    def url_for(self, rel_path: str) -> str:
+        # Falls back to the plain URL when the file doesn't exist (yet)
+        digest = self.file_hash(rel_path)
+        if digest is None:
+            return f"{self.url_prefix}/{quote(rel_path)}"
+        stem, ext = os.path.splitext(rel_path)
+        return f"{self.url_prefix}/{quote(f'{stem}.{digest}{ext}')}"
+
+    async def get_response(self, path: str, scope) -> Response:
+        immutable = False
+        match = _FINGERPRINTED.match(path)
+        if match:
+            rel_path = match.group("stem") + match.group("ext")
+            if self.file_hash(rel_path) == match.group("hash"):
+                path, immutable = rel_path, True
+
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+
+# ------------------------
+# Pre-rendered, pre-compressed pages
+# ------------------------
+class CachedPage:
+    # Holds one rendered page with its strong ETag and compressed variants,
+    # so serving it is a dictionary lookup.
+
+    def __init__(self, html: str, media_type: str = "text/html; charset=utf-8"):
+        self.media_type = media_type
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def _pick_encoding(self, accept_encoding: str) -> str:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")
+                    if not part.strip().endswith(";q=0")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        encoding = self._pick_encoding(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match:
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in candidates or candidates & self.etags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
@@ -0,0 +1,127 @@
+import struct
+import threading
+from typing import Any, Dict, Optional
+
+from app.video_utils import av, PyAVDecoder, select_key_frames, DECODE_MODE, MAX_WIDTH
+
+# ------------------------
+# Streaming decode (decode while the upload is still arriving)
+# ------------------------
+# Bytes sniffed before deciding whether the container can be decoded front-to-back
+STREAM_SNIFF_BYTES = 64 * 1024
+
+
+class StreamPipe:
+    # Non-seekable, file-like byte pipe: the event loop feed()s upload chunks while
+    # a decoder thread read()s them, blocking until data arrives. Everything fed is
+    # also kept, so the upload can still be decoded the normal way if streaming fails.
+
+    def __init__(self):
+        self._data = bytearray()
+        self._read_pos = 0
+        self._closed = False
+        self._error: Optional[Exception] = None
+        self._cond = threading.Condition()
+
+    def feed(self, chunk: bytes):
+        with self._cond:
+            self._data += chunk
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def abort(self, error: Exception):
+        # Makes a blocked read() raise, e.g. when the client disconnects
+        with self._cond:
+            self._error = error
+            self._closed = True
+            self._cond.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b""
+        with self._cond:
+            while True:
+                if self._error is not None:
+                    raise self._error
+                available = len(self._data) - self._read_pos
+                # read(n) returns whatever is there; read() waits for the whole upload
+                if available > 0 and (size > 0 or self._closed):
+                    break
+                if self._closed:
+                    return b""
+                self._cond.wait()
+            end = len(self._data) if size < 0 else min(len(self._data), self._read_pos + size)
+            chunk = bytes(self._data[self._read_pos:end])
+            self._read_pos = end
+            return chunk
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def head(self, size: int = STREAM_SNIFF_BYTES) -> bytes:
+        return bytes(self._data[:size])
+
+    def getbuffer(self) -> memoryview:
+        # Everything fed so far, without copying it; valid until discard()
+        return memoryview(self._data)
+
+    def discard(self):
+        # Frees the fed bytes once they have been copied elsewhere
+        with self._cond:
+            self._data = bytearray()
+
+
+def stream_layout(head: bytes) -> Optional[str]:
+    # How the container can be decoded front-to-back:
+    #   "indexed"    MP4/MOV with the full index ("moov") before the media data ("mdat"),
+    #                i.e. "faststart": the clip length is known from the start
+    #   "sequential" fragmented MP4, WebM/MKV, MPEG-TS...: decodable, length unknown
+    #   None         MP4/MOV with the index at the end (typical phone recording): the
+    #                whole file is needed before decoding can start
+    if head[4:8] != b"ftyp":
+        return "sequential"
+    pos = 0
+    while pos + 8 <= len(head):
+        size, box = struct.unpack(">I4s", head[pos:pos + 8])
+        if box == b"moov":
+            # An "mvex" box means the samples live in later fragments
+            return "sequential" if b"mvex" in head[pos:pos + size] else "indexed"
+        if box == b"moof":
+            return "sequential"
+        if box == b"mdat":
+            return None
+        if size == 1 and pos + 16 <= len(head):
+            size = struct.unpack(">Q", head[pos + 8:pos + 16])[0]
+        if size < 8:
+            return None
+        pos += size
+    return None
+
+
+def stream_decoding_available() -> bool:
+    return av is not None
+
+
+def extract_key_frames_from_stream(pipe: StreamPipe, layout: str, timer=None,
+                                   encoding: Optional[Dict[str, Any]] = None, cancel=None) -> Dict[str, Any]:
+    # Runs in a worker thread while the upload is fed into `pipe`; raises ValueError
+    # if FFmpeg can't read the container without seeking.
+    decoder = PyAVDecoder(pipe, keyframes_only=(DECODE_MODE == "keyframes"), max_width=MAX_WIDTH)
+    try:
+        if layout != "indexed":
+            # Header frame counts of fragmented/live containers only cover what's
+            # written so far; let the sampler spread itself over the real length
+            decoder.total_frames = 0
+            decoder.duration_sec = 0.0
+        result = select_key_frames(decoder, timer=timer, encoding=encoding, cancel=cancel)
+    except av.FFmpegError as e:
+        raise ValueError(f"Could not decode video stream: {e}") from e
+    finally:
+        decoder.close()
+    if result["frames_decoded"] == 0:
+        raise ValueError("No frames could be decoded from the video stream.")
+    return result
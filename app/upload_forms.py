@@ -0,0 +1,49 @@
+import os
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from starlette.formparsers import MultiPartParser, MultiPartException
+
+from app.video_utils import memory_file
+
+# ------------------------
+# Multipart parsing for video uploads
+# ------------------------
+# Starlette spools file parts to a SpooledTemporaryFile that rolls over to disk
+# after 1 MB, and handlers then read() the whole video back into memory. Routes
+# using VideoUploadRoute instead get every file part written straight into a
+# memory file (memfd / tmpfs, see video_utils.memory_file) while the body is
+# parsed: the video exists once, in memory, and decoders open it by path.
+# Other routes keep Starlette's defaults.
+
+
+class VideoFormParser(MultiPartParser):
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        upload = self._current_part.file
+        if upload is not None:
+            # Swap the spool file Starlette just created for a memory file
+            self._files_to_close_on_error.pop().close()
+            # Only the extension of the client filename is used (never the path itself)
+            ext = os.path.splitext(upload.filename or "")[1].lower()
+            upload.file = memory_file(ext if ext[1:].isalnum() else ".mp4")
+            self._files_to_close_on_error.append(upload.file)
+
+
+class VideoUploadRoute(APIRoute):
+    # Parses multipart bodies with VideoFormParser; FastAPI then finds the form
+    # already parsed on the request and closes its files after the response
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def parse_then_handle(request: Request):
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                try:
+                    request._form = await VideoFormParser(request.headers, request.stream()).parse()
+                except MultiPartException as e:
+                    raise HTTPException(status_code=400, detail=e.message)
+            return await handler(request)
+
+        return parse_then_handle
@@ -0,0 +1,192 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+from app.cache import frame_cache, file_content_key
+from app.jobs import JOB_INPUT_DIR
+from app.job_routes import get_store as get_job_store
+from app.cancellation import EXTRACT_DEADLINE_SEC, CANCELLED_REQUESTS, RequestCancelled, cancel_scope, cancelled_status
+from app.metrics import (
+    StageTimer,
+    BYTES_IN,
+    BYTES_OUT,
+    UPLOAD_BYTES,
+    FRAMES_DECODED,
+    FRAMES_KEPT,
+    EXTRACTIONS_IN_FLIGHT,
+)
+from app.singleflight import frame_flight
+from app.uploads import UploadStore, UploadConflict, public_upload
+from app.video_utils import extract_key_frames, extraction_settings, encode_settings
+
+# ------------------------
+# Resumable uploads
+# ------------------------
+# 1. POST   /uploads                    size=<total bytes>, filename=...  -> upload_id
+# 2. PUT    /uploads/{id}?offset=N      raw chunk bytes                   -> new offset
+#    GET    /uploads/{id}                                                 -> current offset (resume here)
+# 3. POST   /uploads/{id}/finalize      same options as /extract_frames   -> frames (or a job with ?job=true)
+router = APIRouter(prefix="/uploads")
+
+_store = None
+
+
+def get_store() -> UploadStore:
+    global _store
+    if _store is None:
+        _store = UploadStore()
+    return _store
+
+
+def _not_found() -> JSONResponse:
+    return JSONResponse(status_code=404, content={"message": "Upload not found."})
+
+
+@router.post("", status_code=201)
+async def create_upload(size: int = Form(...), filename: str = Form("")):
+    try:
+        upload = await run_in_threadpool(get_store().create, size, filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    return JSONResponse(status_code=201, content=public_upload(upload),
+                        headers={"Location": f"/uploads/{upload['id']}"})
+
+
+@router.get("/{upload_id}")
+async def upload_status(upload_id: str):
+    upload = await run_in_threadpool(get_store().get, upload_id)
+    if upload is None:
+        return _not_found()
+    return public_upload(upload)
+
+
+@router.put("/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int):
+    store = get_store()
+    upload = await run_in_threadpool(store.get, upload_id)
+    if upload is None:
+        return _not_found()
+    remaining = upload["size"] - offset
+    received = 0
+    try:
+        f = await run_in_threadpool(store.open_chunk, upload_id, offset)
+    except UploadConflict as e:
+        return JSONResponse(status_code=409, content={"message": str(e), "offset": e.offset})
+    except KeyError:
+        return _not_found()
+    # Disk writes (and the flock above) stay off the event loop
+    try:
+        async for chunk in request.stream():
+            if received + len(chunk) > remaining:
+                # Keep what fits; the rest can never be part of this upload
+                await run_in_threadpool(f.write, chunk[:remaining - received])
+                return JSONResponse(status_code=413, content={
+                    "message": "Chunk runs past the declared upload size.", "offset": upload["size"]})
+            await run_in_threadpool(f.write, chunk)
+            received += len(chunk)
+    except ClientDisconnect:
+        # Whatever arrived before the connection dropped is kept; the client resumes from there
+        pass
+    finally:
+        await run_in_threadpool(f.close)
+    BYTES_IN.inc(received, endpoint="uploads")
+    return public_upload(await run_in_threadpool(store.get, upload_id))
+
+
+@router.delete("/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    try:
+        await run_in_threadpool(get_store().delete, upload_id)
+    except KeyError:
+        return _not_found()
+
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, request: Request, job: bool = False, image_format: Optional[str] = None,
+                          quality: Optional[int] = None, max_frame_bytes: Optional[int] = None,
+                          max_total_bytes: Optional[int] = None):
+    # Hands the assembled video to frame extraction: inline (same response as
+    # /extract_frames) or, with ?job=true, as a background job (same as /jobs/extract_frames)
+    store = get_store()
+    upload = await run_in_threadpool(store.get, upload_id)
+    if upload is None:
+        return _not_found()
+    if not upload["complete"]:
+        return JSONResponse(status_code=409, content={
+            "message": f"Upload incomplete: {upload['offset']} of {upload['size']} bytes received.",
+            "offset": upload["offset"]})
+    try:
+        encoding = encode_settings(image_format, quality, max_frame_bytes, max_total_bytes)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"frames": [], "message": str(e)})
+
+    # One finalize per upload, across all workers: a retried or doubled finalize
+    # gets 409 while this one runs, and 404 once the upload is consumed
+    try:
+        claim = await run_in_threadpool(store.claim, upload_id)
+    except UploadConflict as e:
+        return JSONResponse(status_code=409, content={"message": str(e), "offset": e.offset})
+    except KeyError:
+        return _not_found()
+    UPLOAD_BYTES.observe(upload["size"], endpoint="uploads")
+
+    try:
+        if job:
+            input_path = os.path.join(JOB_INPUT_DIR, f"{upload_id}.mp4")
+            job_store = get_job_store()
+            await run_in_threadpool(store.take, upload_id, input_path)
+            job_id = await run_in_threadpool(job_store.submit, "extract_frames",
+                                             {"filename": upload["filename"], "encoding": encoding}, input_path)
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+        return await _extract_upload(request, upload, encoding)
+    finally:
+        if not job:
+            await run_in_threadpool(store.delete, upload_id)
+        await run_in_threadpool(claim.close)
+
+
+async def _extract_upload(request: Request, upload, encoding):
+    # The inline finalize, run like /extract_frames: shared cache, coalesced with
+    # identical extractions, stopped on disconnect / deadline, latency observed
+    timer = StageTimer("uploads_finalize")
+    status = 200
+    try:
+        with EXTRACTIONS_IN_FLIGHT.track():
+            with timer.stage("cache_lookup"):
+                cache_key = await run_in_threadpool(file_content_key, upload["path"], "extract_frames",
+                                                    extraction_settings(encoding))
+                cached = await run_in_threadpool(frame_cache.get, cache_key)
+            if cached is not None:
+                return {"frames": cached, "cached": True}
+
+            async def extract():
+                result = await run_in_threadpool(extract_key_frames, upload["path"], timer=timer,
+                                                 encoding=encoding, cancel=cancel)
+                await run_in_threadpool(frame_cache.set, cache_key, result["frames"])
+                FRAMES_DECODED.inc(result["frames_decoded"])
+                FRAMES_KEPT.inc(len(result["frames"]))
+                return result["frames"]
+
+            try:
+                async with cancel_scope(request, EXTRACT_DEADLINE_SEC) as cancel:
+                    frames, shared = await frame_flight.do(cache_key, extract)
+            except RequestCancelled as e:
+                CANCELLED_REQUESTS.inc(endpoint="uploads_finalize", reason=e.reason)
+                status = cancelled_status(e.reason)
+                return JSONResponse(status_code=status, content={
+                    "frames": [], "message": f"Extraction cancelled ({e.reason})."})
+            except ValueError as e:
+                status = 400
+                return JSONResponse(status_code=400, content={"frames": [], "message": str(e)})
+
+        BYTES_OUT.inc(sum(len(f["base64_data"]) for f in frames), endpoint="uploads")
+        return {"frames": frames, "coalesced": True} if shared else {"frames": frames}
+    except Exception:
+        status = 500
+        raise
+    finally:
+        timer.observe(status)
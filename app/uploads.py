@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+from typing import Dict, Any, List, Optional, BinaryIO
+
+from app.jobs import JOBS_DIR
+from app.limits import MAX_UPLOAD_BYTES
+
+# ------------------------
+# Resumable upload config
+# ------------------------
+# Partial uploads must survive a dropped connection and land on whichever web
+# worker serves the next chunk, so they live on disk next to the job inputs.
+UPLOADS_DIR = os.getenv("UPLOADS_DIR", os.path.join(JOBS_DIR, "uploads"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(MAX_UPLOAD_BYTES or 2 * 1024 * 1024 * 1024)))
+# Unfinished uploads untouched for this long are deleted
+UPLOAD_TTL_SEC = float(os.getenv("UPLOAD_TTL_SEC", str(24 * 3600)))
+# Suggested to clients; any chunk size works
+UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadConflict(Exception):
+    # The client's idea of the upload offset is out of date (or another chunk is in flight)
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadStore:
+    # One "<id>.part" data file plus a "<id>.json" sidecar per upload. The data
+    # file's size *is* the committed offset, so a chunk cut off mid-way still
+    # counts for what arrived. flock() keeps two chunks (or a chunk and a
+    # finalize, or two finalizes) from overlapping, even across worker processes.
+
+    def __init__(self, directory: str = UPLOADS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id: str):
+        if not _UPLOAD_ID.match(upload_id):
+            raise KeyError(upload_id)
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def create(self, size: int, filename: str = "") -> Dict[str, Any]:
+        if not 0 < size <= UPLOAD_MAX_BYTES:
+            raise ValueError(f"Upload size must be between 1 and {UPLOAD_MAX_BYTES} bytes.")
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(upload_id)
+        meta = {"id": upload_id, "size": size, "filename": filename, "created_at": time.time()}
+        open(data_path, "wb").close()
+        with open(meta_path, "w") as f:
+            json.dump(meta, f)
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            data_path, meta_path = self._paths(upload_id)
+            with open(meta_path) as f:
+                meta = json.load(f)
+            offset = os.path.getsize(data_path)
+        except (KeyError, OSError, ValueError):
+            return None
+        return {**meta, "offset": offset, "complete": offset == meta["size"], "path": data_path}
+
+    def open_chunk(self, upload_id: str, offset: int) -> BinaryIO:
+        # Returns the data file, locked and positioned at `offset`, for the caller
+        # to write to and close; raises UploadConflict when `offset` isn't the
+        # current end of the upload.
+        f = self._lock(upload_id, "Another chunk for this upload is in progress.")
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            f.close()
+            raise UploadConflict(f"Upload is at offset {current}, not {offset}.", current)
+        return f
+
+    def claim(self, upload_id: str) -> BinaryIO:
+        # Locks a finished upload for finalizing: a second finalize, or a stray
+        # chunk, gets UploadConflict until the returned file is closed
+        return self._lock(upload_id, "Upload is busy (a chunk or finalize is in progress).")
+
+    def _lock(self, upload_id: str, busy_message: str) -> BinaryIO:
+        upload = self.get(upload_id)
+        if upload is None:
+            raise KeyError(upload_id)
+        try:
+            # No O_CREAT: a finalized (removed) upload must not come back empty
+            f = os.fdopen(os.open(upload["path"], os.O_WRONLY | os.O_APPEND), "ab")
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            raise UploadConflict(busy_message, upload["offset"])
+        if not os.path.exists(upload["path"]):
+            # Finalized and removed while we waited to open it
+            f.close()
+            raise KeyError(upload_id)
+        return f
+
+    def take(self, upload_id: str, destination: str):
+        # Moves a finished upload's data to `destination` and forgets the upload
+        data_path, meta_path = self._paths(upload_id)
+        os.replace(data_path, destination)
+        os.remove(meta_path)
+
+    def delete(self, upload_id: str):
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expire(self, ttl_sec: float = UPLOAD_TTL_SEC):
+        # An upload is as old as its newest file: the sidecar is written once, but
+        # the data file on every chunk, so a slow upload still receiving chunks stays
+        cutoff = time.time() - ttl_sec
+        files: Dict[str, List[str]] = {}
+        newest: Dict[str, float] = {}
+        for name in os.listdir(self.directory):
+            upload_id = name.split(".", 1)[0]
+            try:
+                mtime = os.path.getmtime(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.setdefault(upload_id, []).append(name)
+            newest[upload_id] = max(newest.get(upload_id, 0.0), mtime)
+        for upload_id, names in files.items():
+            if newest[upload_id] >= cutoff:
+                continue
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+def public_upload(upload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "upload_id": upload["id"],
+        "offset": upload["offset"],
+        "size": upload["size"],
+        "complete": upload["complete"],
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+    }
@@ -0,0 +1,628 @@
+import os
+import base64
+import importlib.util
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Callable, Optional, Iterator
+
+from app.metrics import timed, DUPLICATE_FRAMES, EXTRACTION_BUFFER_BYTES, record_peak_rss
+from app.startup import lazy_import
+from app.logging_utils import get_logger
+from app.frame_quality import score_frames, quality_settings
+from app.frame_hash import unique_indices, hash_settings
+from app.limits import check_video, check_duration
+from app.cancellation import RequestCancelled, FRAMES_NOT_DECODED, check_cancelled
+
+# Deferred so the web process can answer before OpenCV/NumPy finish loading
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+
+# Optional: extraction falls back to the OpenCV decoder without it
+av = lazy_import("av") if importlib.util.find_spec("av") is not None else None
+
+logger = get_logger("video")
+
+# ------------------------
+# Extraction settings
+# ------------------------
+MAX_WIDTH = 800
+TARGET_FRAMES = 6
+# Frames screened per clip, evenly spaced
+SAMPLE_POINTS = 10
+# Output image format for extracted frames ("jpeg", "webp" or "avif") and its quality (1-100)
+ENCODE_FORMAT = os.getenv("ENCODE_FORMAT", "jpeg")
+ENCODE_QUALITY = int(os.getenv("ENCODE_QUALITY", "75"))
+# Threads encoding the kept frames in parallel (cv2.imencode releases the GIL); 0 = one per core, max 4
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+# Byte budgets for encoded frames (0 = unlimited). A frame over budget is re-encoded at
+# the highest quality that fits (binary search), then downscaled if even that is too big.
+# The payload budget is split evenly across the frames of one response.
+MAX_FRAME_BYTES = int(os.getenv("MAX_FRAME_BYTES", "0"))
+MAX_PAYLOAD_BYTES = int(os.getenv("MAX_PAYLOAD_BYTES", "0"))
+MIN_BUDGET_QUALITY = 20
+MIN_BUDGET_WIDTH = 320
+BUDGET_DOWNSCALE = 0.75
+# Frames with a grayscale std below this are treated as blank/featureless; the
+# rest are ranked by app.frame_quality (the browser extractor ports both)
+MIN_DETAIL_STD = 10
+
+# Decoder used for extraction: "opencv" (cv2.VideoCapture) or "pyav" (FFmpeg via
+# PyAV, multithreaded). DECODE_MODE="keyframes" decodes only I-frames (pyav only),
+# a coarse scan that runs many times faster than real time on long videos.
+DECODER_BACKEND = os.getenv("DECODER_BACKEND", "opencv")
+DECODE_MODE = os.getenv("DECODE_MODE", "all")
+# 0 lets FFmpeg pick (one thread per core)
+DECODER_THREADS = int(os.getenv("DECODER_THREADS", "0"))
+
+# Hard ceiling on the frame data one extraction may hold (decode buffer plus the
+# candidate frames), checked before decoding starts and as candidates pile up.
+# Sized so a few concurrent 4K extractions fit the container; 0 = unlimited.
+# The upload itself is bounded by MAX_UPLOAD_BYTES and held once, in a memory file.
+EXTRACT_MEMORY_LIMIT_MB = int(os.getenv("EXTRACT_MEMORY_LIMIT_MB", "256"))
+
+# Motion profile sampling used to align two videos
+MOTION_SAMPLE_FPS = 10.0
+MOTION_WIDTH = 160
+MAX_ALIGN_OFFSET_SEC = 10.0
+
+# Uploads are decoded from memory: a memfd when the kernel supports it, otherwise
+# a file in /dev/shm (tmpfs). The system temp dir is only the last resort.
+USE_MEMFD = os.getenv("USE_MEMFD", "1") != "0"
+MEMORY_TEMP_DIR = os.getenv("MEMORY_TEMP_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+
+def extraction_settings(encoding: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Everything that changes extraction output; part of the frame cache key
+    backend, mode = decoder_config()
+    return {"max_width": MAX_WIDTH, "target_frames": TARGET_FRAMES,
+            "min_detail_std": MIN_DETAIL_STD, "scoring": quality_settings(), "dedup": hash_settings(),
+            "decoder": backend, "decode_mode": mode,
+            **(encoding or encode_settings())}
+
+
+def memory_file(suffix: str = ".mp4"):
+    # Writable binary file in memory rather than on disk: an anonymous memfd (Linux),
+    # else a tmpfs file deleted on close. Decoders open it by memory_file_path().
+    if USE_MEMFD and hasattr(os, "memfd_create"):
+        try:
+            return open(os.memfd_create("synchro-video", os.MFD_CLOEXEC), "w+b")
+        except OSError:
+            pass
+    return tempfile.NamedTemporaryFile(suffix=suffix, dir=MEMORY_TEMP_DIR)
+
+
+def memory_file_path(f) -> str:
+    # cv2.VideoCapture needs a path: a memfd is reachable through /proc/self/fd
+    return f.name if isinstance(f.name, str) else f"/proc/self/fd/{f.fileno()}"
+
+
+@contextmanager
+def memory_video(data: bytes, suffix: str = ".mp4") -> Iterator[str]:
+    # Path to a memory file holding `data` (bytes or a buffer), for uploads that
+    # arrive as bytes; multipart uploads are parsed straight into memory files
+    with memory_file(suffix) as f:
+        f.write(data)
+        f.flush()
+        # Drop our reference so the caller can free the upload bytes during decoding
+        del data
+        yield memory_file_path(f)
+
+
+def resize_frame(frame, max_width: int = MAX_WIDTH):
+    height, width = frame.shape[:2]
+    if width <= max_width:
+        return frame
+    ratio = max_width / width
+    new_height = int(height * ratio)
+    return cv2.resize(frame, (max_width, new_height), interpolation=cv2.INTER_AREA)
+
+
+# ------------------------
+# Frame encoding
+# ------------------------
+IMAGE_FORMATS: Dict[str, Dict[str, str]] = {
+    "jpeg": {"ext": ".jpg", "mime_type": "image/jpeg", "quality_flag": "IMWRITE_JPEG_QUALITY"},
+    "webp": {"ext": ".webp", "mime_type": "image/webp", "quality_flag": "IMWRITE_WEBP_QUALITY"},
+    # Only when OpenCV was built with libavif
+    "avif": {"ext": ".avif", "mime_type": "image/avif", "quality_flag": "IMWRITE_AVIF_QUALITY"},
+}
+
+_encode_pool: Optional[ThreadPoolExecutor] = None
+_encode_pool_lock = threading.Lock()
+
+
+def available_formats() -> List[str]:
+    return [name for name, spec in IMAGE_FORMATS.items()
+            if hasattr(cv2, spec["quality_flag"]) and cv2.haveImageWriter(spec["ext"])]
+
+
+def encode_settings(image_format: Optional[str] = None, quality: Optional[int] = None,
+                    max_frame_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None) -> Dict[str, Any]:
+    # Per-request overrides merged over the env defaults. Raises ValueError with a
+    # client-facing message for unusable options.
+    if image_format is not None and image_format not in available_formats():
+        raise ValueError(f"Unsupported image format '{image_format}'. Available: {', '.join(available_formats())}.")
+    if quality is not None and not 1 <= quality <= 100:
+        raise ValueError("Quality must be between 1 and 100.")
+    for name, value in (("max_frame_bytes", max_frame_bytes), ("max_total_bytes", max_total_bytes)):
+        if value is not None and value < 1024:
+            raise ValueError(f"{name} must be at least 1024.")
+    return {
+        "image_format": image_format or ENCODE_FORMAT,
+        "quality": quality or ENCODE_QUALITY,
+        "max_frame_bytes": max_frame_bytes if max_frame_bytes is not None else MAX_FRAME_BYTES,
+        "max_total_bytes": max_total_bytes if max_total_bytes is not None else MAX_PAYLOAD_BYTES,
+    }
+
+
+def encode_frame(frame, image_format: str = ENCODE_FORMAT, quality: int = ENCODE_QUALITY) -> bytes:
+    spec = IMAGE_FORMATS[image_format]
+    ok, buffer = cv2.imencode(spec["ext"], frame, [getattr(cv2, spec["quality_flag"]), quality])
+    if not ok:
+        raise ValueError(f"Could not encode frame as {image_format}.")
+    return buffer.tobytes()
+
+
+def encode_within_budget(frame, image_format: str, quality: int, max_bytes: int) -> Tuple[bytes, int, Any]:
+    # Returns (encoded, quality, frame actually encoded). Keeps `quality` when it fits,
+    # otherwise binary-searches the best quality that does, downscaling as a last resort.
+    # If nothing fits, the smallest encoding tried is returned.
+    smallest = None
+    while True:
+        encoded = encode_frame(frame, image_format, quality)
+        if len(encoded) <= max_bytes:
+            return encoded, quality, frame
+
+        fit = None
+        low, high = MIN_BUDGET_QUALITY, quality - 1
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = encode_frame(frame, image_format, mid)
+            if len(candidate) <= max_bytes:
+                fit = (candidate, mid, frame)
+                low = mid + 1
+            else:
+                high = mid - 1
+                if smallest is None or len(candidate) < len(smallest[0]):
+                    smallest = (candidate, mid, frame)
+        if fit is not None:
+            return fit
+
+        height, width = frame.shape[:2]
+        if width * BUDGET_DOWNSCALE < MIN_BUDGET_WIDTH:
+            return smallest or (encoded, quality, frame)
+        size = (int(width * BUDGET_DOWNSCALE), int(height * BUDGET_DOWNSCALE))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def _encode_for_response(frame, image_format: str, quality: int, max_bytes: int) -> Dict[str, Any]:
+    if max_bytes > 0:
+        encoded, quality, frame = encode_within_budget(frame, image_format, quality, max_bytes)
+    else:
+        encoded = encode_frame(frame, image_format, quality)
+    height, width = frame.shape[:2]
+    return {
+        "base64_data": base64.b64encode(encoded).decode('utf-8'),
+        "mime_type": IMAGE_FORMATS[image_format]["mime_type"],
+        "encoded_bytes": len(encoded),
+        "quality": quality,
+        "width": width,
+        "height": height,
+    }
+
+
+def encode_frames(frames: List[Any], encoding: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    # Encodes + base64s every frame on the shared encoder threads, preserving order.
+    # `encoding` comes from encode_settings() (env defaults when omitted).
+    global _encode_pool
+    encoding = encoding or encode_settings()
+    max_bytes = encoding["max_frame_bytes"]
+    if encoding["max_total_bytes"] and frames:
+        share = encoding["max_total_bytes"] // len(frames)
+        max_bytes = min(max_bytes, share) if max_bytes else share
+
+    def encode(frame):
+        return _encode_for_response(frame, encoding["image_format"], encoding["quality"], max_bytes)
+
+    if len(frames) <= 1 or ENCODE_WORKERS <= 1:
+        return [encode(frame) for frame in frames]
+    if _encode_pool is None:
+        with _encode_pool_lock:
+            if _encode_pool is None:
+                _encode_pool = ThreadPoolExecutor(ENCODE_WORKERS, thread_name_prefix="encode")
+    return list(_encode_pool.map(encode, frames))
+
+
+# ------------------------
+# Decoder backends
+# ------------------------
+def decoder_config() -> Tuple[str, str]:
+    # Effective (backend, mode) after falling back for a missing PyAV install
+    backend, mode = DECODER_BACKEND, DECODE_MODE
+    if backend == "pyav" and av is None:
+        backend = "opencv"
+    if backend != "pyav":
+        mode = "all"
+    return backend, mode
+
+
+class MemoryLimitExceeded(ValueError):
+    pass
+
+
+class FrameMemory:
+    # Accounts the frame data one extraction holds against EXTRACT_MEMORY_LIMIT_MB
+
+    def __init__(self, limit_mb: int = EXTRACT_MEMORY_LIMIT_MB):
+        self.limit = limit_mb * 1024 * 1024
+        self.current = 0
+        self.peak = 0
+
+    def reserve(self, nbytes: int):
+        if self.limit and self.current + nbytes > self.limit:
+            raise MemoryLimitExceeded(
+                f"Video needs more than the {self.limit // (1024 * 1024)} MB frame memory limit; "
+                "try a lower resolution or a shorter clip.")
+        self.current += nbytes
+        self.peak = max(self.peak, self.current)
+
+    def release(self, nbytes: int):
+        self.current -= nbytes
+
+
+class OpenCVDecoder:
+    # Frames are decoded into one reused buffer, and skipped frames are only
+    # grab()bed (never converted to BGR), so a long 4K clip allocates one frame.
+    # Callers must copy a yielded frame they want to keep.
+    reuses_buffer = True
+
+    def __init__(self, path: str):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise ValueError("Could not open video file.")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.duration_sec = self.total_frames / self.fps
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # cv2 decodes at full resolution; this is its BGR buffer
+        self.frame_bytes = self.width * self.height * 3
+        self.frames_decoded = 0
+        self._buffer = None
+
+    def frames(self, step: int = 1, timer=None, cancel=None) -> Iterator[Tuple[int, float, Any]]:
+        # `self.step` may be changed by the caller between yields.
+        # `cancel` (an app.cancellation.CancelToken) is checked before every frame.
+        self.step = step
+        while True:
+            check_cancelled(cancel)
+            with timed(timer, "decode"):
+                if not self.cap.grab(): break
+                index = self.frames_decoded
+                self.frames_decoded += 1
+                wanted = index % self.step == 0
+                if wanted:
+                    ret, self._buffer = self.cap.retrieve(self._buffer)
+            if wanted:
+                if not ret: break
+                yield index, index / self.fps, self._buffer
+
+    def close(self):
+        self.cap.release()
+
+
+class PyAVDecoder:
+    # FFmpeg through PyAV: frame/slice threading and real presentation timestamps.
+    # `source` may also be a file-like object, including a non-seekable StreamPipe.
+    # Sampled frames are scaled to `max_width` by swscale while converting to BGR,
+    # so a full-resolution BGR copy of a 4K frame is never made.
+    reuses_buffer = False
+
+    def __init__(self, source: Any, keyframes_only: bool = False, max_width: Optional[int] = None):
+        try:
+            self.container = av.open(source)
+        except (av.FFmpegError, OSError) as e:
+            raise ValueError("Could not open video file.") from e
+        if not self.container.streams.video:
+            self.container.close()
+            raise ValueError("Could not open video file.")
+
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = "AUTO"
+        if DECODER_THREADS > 0:
+            self.stream.thread_count = DECODER_THREADS
+        self.keyframes_only = keyframes_only
+        if keyframes_only:
+            # The decoder drops every non-I-frame before doing any work on it
+            self.stream.codec_context.skip_frame = "NONKEY"
+
+        self.width = self.stream.codec_context.width
+        self.height = self.stream.codec_context.height
+        self.output_size = None
+        if max_width and self.width > max_width:
+            self.output_size = (max_width, int(self.height * max_width / self.width))
+        out_width, out_height = self.output_size or (self.width, self.height)
+        # FFmpeg's own YUV 4:2:0 frame plus the BGR output
+        self.frame_bytes = self.width * self.height * 3 // 2 + out_width * out_height * 3
+
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 30.0
+        if self.stream.duration is not None:
+            self.duration_sec = float(self.stream.duration * self.stream.time_base)
+        elif self.container.duration is not None:
+            self.duration_sec = self.container.duration / av.time_base
+        else:
+            self.duration_sec = 0.0
+        self.total_frames = self.stream.frames or int(self.duration_sec * self.fps)
+        self.frames_decoded = 0
+
+    def frames(self, step: int = 1, timer=None, cancel=None) -> Iterator[Tuple[int, float, Any]]:
+        # In keyframes mode `step` becomes a time interval: the first key frame at or
+        # after each sampling point is used, so the sample count doesn't grow with the GOP
+        # `self.step` may be changed by the caller between yields
+        self.step = step
+        start_pts = self.stream.start_time or 0
+        next_sample_sec = 0.0
+        decoded = self._decode()
+        while True:
+            check_cancelled(cancel)
+            with timed(timer, "decode"):
+                try:
+                    frame = next(decoded, None)
+                except av.FFmpegError as e:
+                    # Like cv2, treat a corrupt tail as the end of the video
+                    logger.warning("Decoding stopped early: %s", e)
+                    frame = None
+                image = None
+                if frame is not None:
+                    index = self.frames_decoded
+                    self.frames_decoded += 1
+                    if frame.pts is not None:
+                        timestamp = float((frame.pts - start_pts) * self.stream.time_base)
+                    else:
+                        timestamp = index / self.fps
+                    if self.keyframes_only:
+                        wanted = timestamp >= next_sample_sec
+                    else:
+                        wanted = index % self.step == 0
+                    if wanted:
+                        next_sample_sec = timestamp + self.step / self.fps
+                        if self.output_size:
+                            width, height = self.output_size
+                            image = frame.to_ndarray(format="bgr24", width=width, height=height,
+                                                     interpolation="AREA")
+                        else:
+                            image = frame.to_ndarray(format="bgr24")
+            if frame is None: break
+            if image is not None:
+                yield index, timestamp, image
+
+    def _decode(self) -> Iterator[Any]:
+        if not self.keyframes_only:
+            yield from self.container.decode(self.stream)
+            return
+        for packet in self.container.demux(self.stream):
+            # Non-key packets never reach the decoder; the empty packet at the end flushes it
+            if packet.is_keyframe or packet.size == 0:
+                yield from packet.decode()
+
+    def close(self):
+        self.container.close()
+
+
+def open_video(path: str, backend: Optional[str] = None, mode: Optional[str] = None):
+    # Returns a decoder with fps/total_frames/duration_sec, frames(step) and close()
+    default_backend, default_mode = decoder_config()
+    backend = backend or default_backend
+    mode = mode or default_mode
+    if backend == "pyav":
+        if av is None:
+            logger.warning("DECODER_BACKEND=pyav but PyAV is not installed; using OpenCV.")
+        else:
+            return PyAVDecoder(path, keyframes_only=(mode == "keyframes"), max_width=MAX_WIDTH)
+    return OpenCVDecoder(path)
+
+
+# ------------------------
+# Key frame extraction
+# ------------------------
+def extract_key_frames(path: str, target_frames: int = TARGET_FRAMES,
+                       progress: Optional[Callable[[float], None]] = None,
+                       timer=None, encoding: Optional[Dict[str, Any]] = None, cancel=None) -> Dict[str, Any]:
+    decoder = open_video(path)
+    try:
+        return select_key_frames(decoder, target_frames, progress, timer, encoding, cancel)
+    finally:
+        decoder.close()
+
+
+def select_key_frames(decoder, target_frames: int = TARGET_FRAMES,
+                      progress: Optional[Callable[[float], None]] = None,
+                      timer=None, encoding: Optional[Dict[str, Any]] = None, cancel=None) -> Dict[str, Any]:
+    # `progress` (if given) is called with the decoded fraction at each sampled frame.
+    # `cancel` (an app.cancellation.CancelToken) stops decoding early with RequestCancelled.
+    # `timer` (an app.metrics.StageTimer) collects decode/screen/resize/encode time.
+    # Sample ~SAMPLE_POINTS frames across the clip (every key frame in keyframes mode).
+    # When the length isn't known up front (a video still being uploaded), the stride
+    # doubles whenever 2 * SAMPLE_POINTS samples pile up, so the samples stay evenly
+    # spread over however long the clip turns out to be.
+    # The best-scoring `target_frames` candidates are kept, in time order, with at
+    # most one frame per cluster of near-duplicates.
+    # Raises MemoryLimitExceeded (a ValueError) when the frames wouldn't fit
+    # EXTRACT_MEMORY_LIMIT_MB, and VideoTooLarge (also a ValueError) for videos over
+    # the resolution/duration limits, from the container metadata before decoding.
+    known_length = decoder.total_frames > 0
+    check_video(decoder.width, decoder.height, decoder.duration_sec if known_length else 0.0)
+    step = max(1, decoder.total_frames // SAMPLE_POINTS) if known_length else 1
+    memory = FrameMemory()
+    memory.reserve(decoder.frame_bytes)
+
+    samples: List[Tuple[int, float, Any]] = []
+    detail: Dict[int, float] = {}
+    try:
+        for index, timestamp, frame in decoder.frames(step, timer=timer, cancel=cancel):
+            if progress and decoder.duration_sec > 0:
+                progress(min(timestamp / decoder.duration_sec, 1.0))
+            if not known_length:
+                # No duration in the metadata (still streaming in): stop once it's too long
+                check_duration(timestamp)
+            # Blank/featureless check on the full-resolution frame: downscaling smooths
+            # it and lowers the std, so MIN_DETAIL_STD only holds at full size
+            with timed(timer, "screen"):
+                detail[index] = float(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).std())
+            with timed(timer, "resize"):
+                resized = resize_frame(frame)
+                if resized is frame and decoder.reuses_buffer:
+                    resized = frame.copy()
+            memory.reserve(resized.nbytes)
+            samples.append((index, timestamp, resized))
+            if not known_length and len(samples) > 2 * SAMPLE_POINTS:
+                decoder.step *= 2
+                dropped = [sample for sample in samples if sample[0] % decoder.step != 0]
+                memory.release(sum(sample[2].nbytes for sample in dropped))
+                samples = [sample for sample in samples if sample[0] % decoder.step == 0]
+    except RequestCancelled:
+        FRAMES_NOT_DECODED.inc(max(0, decoder.total_frames - decoder.frames_decoded))
+        raise
+
+    if not known_length and samples:
+        # Now that the length is known, take the samples nearest to where the
+        # fixed-step sampler would have looked
+        final_step = max(1, decoder.frames_decoded // SAMPLE_POINTS)
+        picked = {min(samples, key=lambda sample: abs(sample[0] - target))[0]
+                  for target in range(0, decoder.frames_decoded, final_step)}
+        samples = [sample for sample in samples if sample[0] in picked]
+
+    # Score every candidate at once; select first, encode once at the end
+    check_cancelled(cancel)
+    with timed(timer, "score"):
+        scores = score_frames([frame for _, _, frame in samples], MIN_DETAIL_STD,
+                              [detail[index] for index, _, _ in samples])
+    ranked = sorted((i for i, quality in enumerate(scores) if quality["usable"]),
+                    key=lambda i: scores[i]["score"], reverse=True)
+    with timed(timer, "dedup"):
+        # The best-scoring frame of each cluster represents it
+        unique = unique_indices([frame for _, _, frame in samples], ranked)
+    DUPLICATE_FRAMES.inc(len(ranked) - len(unique), stage="extract")
+    kept = sorted(unique[:target_frames])
+
+    with timed(timer, "encode"):
+        encoded = encode_frames([samples[i][2] for i in kept], encoding)
+    frames = [{**data, "timestamp_sec": round(samples[i][1], 2), "frame_quality": scores[i]}
+              for i, data in zip(kept, encoded)]
+
+    EXTRACTION_BUFFER_BYTES.observe(memory.peak)
+    return {"frames": frames, "fps": decoder.fps, "total_frames": decoder.total_frames,
+            "frames_decoded": decoder.frames_decoded, "peak_buffer_bytes": memory.peak,
+            "peak_rss_bytes": record_peak_rss()}
+
+
+# ------------------------
+# Motion profile & alignment (two-video comparison)
+# ------------------------
+def motion_profile(path: str, sample_fps: float = MOTION_SAMPLE_FPS) -> Dict[str, Any]:
+    # Mean absolute difference between consecutive low-res gray frames,
+    # sampled at roughly `sample_fps`. Used to find motion onsets.
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError("Could not open video file.")
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        check_video(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    total_frames / fps)
+        step = max(1, int(round(fps / sample_fps)))
+
+        energy: List[float] = []
+        prev = None
+        count = 0
+        while True:
+            # grab() skips the colour conversion for frames we don't sample
+            if not cap.grab(): break
+            if count % step == 0:
+                ret, frame = cap.retrieve()
+                if not ret: break
+                small = resize_frame(frame, MOTION_WIDTH)
+                gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+                energy.append(float(np.abs(gray - prev).mean()) if prev is not None else 0.0)
+                prev = gray
+            count += 1
+    finally:
+        cap.release()
+
+    return {
+        "energy": np.asarray(energy, dtype=np.float32),
+        "sample_interval_sec": step / fps,
+        "fps": fps,
+        "duration_sec": (total_frames or count) / fps,
+    }
+
+
+def _onset_envelope(energy: "np.ndarray") -> "np.ndarray":
+    # Positive changes in motion energy mark the start of movements
+    onset = np.maximum(np.diff(energy, prepend=energy[:1]), 0.0)
+    std = onset.std()
+    if std == 0:
+        return np.zeros_like(onset)
+    return (onset - onset.mean()) / std
+
+
+def estimate_offset(profile1: Dict[str, Any], profile2: Dict[str, Any],
+                    max_offset_sec: float = MAX_ALIGN_OFFSET_SEC) -> Tuple[float, float]:
+    # Returns (offset_sec, confidence): the time in video 2 that matches t=0 in
+    # video 1, found by cross-correlating the motion-onset envelopes.
+    interval = profile1["sample_interval_sec"]
+    a = _onset_envelope(profile1["energy"])
+    b = _onset_envelope(profile2["energy"])
+
+    # Resample video 2 onto video 1's sampling grid if the frame rates differ
+    interval2 = profile2["sample_interval_sec"]
+    if len(b) > 1 and abs(interval2 - interval) > 1e-6:
+        t2 = np.arange(len(b)) * interval2
+        b = np.interp(np.arange(0, t2[-1], interval), t2, b).astype(np.float32)
+
+    if len(a) < 2 or len(b) < 2:
+        return 0.0, 0.0
+
+    corr = np.correlate(b, a, mode="full")
+    lags = np.arange(-(len(a) - 1), len(b))
+    # Normalise by the overlap length so long overlaps are not favoured
+    overlap = np.array([min(len(b), lag + len(a)) - max(0, lag) for lag in lags], dtype=np.float32)
+    valid = (overlap >= 2) & (np.abs(lags * interval) <= max_offset_sec)
+    if not valid.any():
+        return 0.0, 0.0
+    score = np.where(valid, corr / np.maximum(overlap, 1.0), -np.inf)
+
+    best = int(np.argmax(score))
+    return float(lags[best] * interval), float(max(score[best], 0.0))
+
+
+def grab_frames_at(path: str, timestamps_sec: List[float]) -> List[Any]:
+    # Seeks to each timestamp and returns the resized frame (None when out of range)
+    cap = cv2.VideoCapture(path)
+    frames: List[Any] = []
+    try:
+        for t in timestamps_sec:
+            cap.set(cv2.CAP_PROP_POS_MSEC, max(t, 0.0) * 1000.0)
+            ret, frame = cap.read()
+            frames.append(resize_frame(frame) if ret else None)
+    finally:
+        cap.release()
+    return frames
+
+
+def matched_timestamps(duration1: float, duration2: float, offset_sec: float,
+                       num_pairs: int = TARGET_FRAMES) -> List[Tuple[float, float]]:
+    # Evenly spaced, time-matched (t1, t2) pairs over the overlapping section
+    start = max(0.0, -offset_sec)
+    end = min(duration1, duration2 - offset_sec)
+    if end <= start:
+        return []
+    # Stay clear of the very first/last frame, which often fail to decode
+    span = end - start
+    times = start + span * (np.arange(num_pairs) + 0.5) / num_pairs
+    return [(round(float(t), 2), round(float(t + offset_sec), 2)) for t in times]
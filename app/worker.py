@@ -0,0 +1,148 @@
+import os
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+from typing import Dict, Any, List
+
+from app.jobs import JobStore, JOBS_DB_PATH, JOB_STALE_SEC
+from app.logging_utils import setup_logging, get_logger, request_id_var
+from app.metrics import start_metrics_export
+
+logger = get_logger("worker")
+
+# ------------------------
+# Worker config
+# ------------------------
+JOB_POLL_INTERVAL_SEC = float(os.getenv("JOB_POLL_INTERVAL_SEC", "1.0"))
+HEARTBEAT_INTERVAL_SEC = 10.0
+# Progress writes are throttled so a fast decode loop doesn't hammer SQLite
+PROGRESS_MIN_INTERVAL_SEC = 0.5
+
+
+def run_job(store: JobStore, job: Dict[str, Any]) -> Dict[str, Any]:
+    # Heavy imports happen here so the supervisor process stays small
+    from app.video_utils import extract_key_frames
+    from app.llm_utils import run_judgement
+
+    params = job["params"]
+    if job["kind"] == "extract_frames":
+        last_write = [0.0]
+
+        def report(fraction: float):
+            now = time.monotonic()
+            if now - last_write[0] >= PROGRESS_MIN_INTERVAL_SEC:
+                last_write[0] = now
+                store.update_progress(job["id"], fraction * 0.99, "Extracting key frames")
+
+        result = extract_key_frames(job["input_path"], progress=report,
+                                    encoding=params.get("encoding"))
+        # Workers are separate processes, so their peak RSS travels with the result
+        return {"frames": result["frames"], "peak_rss_bytes": result["peak_rss_bytes"]}
+
+    if job["kind"] == "judge_base64_frames":
+        store.update_progress(job["id"], 0.1, "Waiting for the judging model")
+        return run_judgement(params["figure_name"], params.get("observations", ""), params["frames"],
+                             params.get("athlete", ""))
+
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+def _keep_alive(store: JobStore, job_id: str, done: threading.Event):
+    # Long LLM calls report no progress, so beat separately to avoid being requeued
+    while not done.wait(HEARTBEAT_INTERVAL_SEC):
+        store.heartbeat(job_id)
+
+
+def worker_loop(name: str, db_path: str = JOBS_DB_PATH, stop: Any = None):
+    # Spawned children start with a fresh interpreter, so they need their own listener
+    setup_logging()
+    start_metrics_export()
+    store = JobStore(db_path)
+    logger.info("Job worker %s started (pid %s).", name, os.getpid())
+    while stop is None or not stop.is_set():
+        job = store.claim_next(name)
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL_SEC)
+            continue
+
+        # Job logs carry the job id where web logs carry the request id
+        request_id_var.set(job["id"])
+        logger.info("Job worker %s running %s job (attempt %s).", name, job["kind"], job["attempts"])
+        done = threading.Event()
+        threading.Thread(target=_keep_alive, args=(store, job["id"], done), daemon=True).start()
+        try:
+            result = run_job(store, job)
+            store.complete(job["id"], result)
+        except Exception as e:
+            logger.exception("Job failed: %s: %s", type(e).__name__, e)
+            store.fail(job["id"], f"{type(e).__name__}: {e}")
+        finally:
+            done.set()
+            if job["input_path"] and os.path.exists(job["input_path"]):
+                os.remove(job["input_path"])
+
+
+# ------------------------
+# Worker pool (embedded in the web app or standalone)
+# ------------------------
+def start_worker_pool(num_workers: int, db_path: str = JOBS_DB_PATH) -> Dict[str, Any]:
+    # "spawn" keeps the children free of the parent's event loop and threads
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    processes: List[Any] = []
+    for i in range(num_workers):
+        proc = ctx.Process(target=worker_loop, args=(f"{prefix}-{i}", db_path, stop), daemon=True)
+        proc.start()
+        processes.append(proc)
+    return {"stop": stop, "processes": processes, "ctx": ctx, "prefix": prefix, "db_path": db_path}
+
+
+def stop_worker_pool(pool: Dict[str, Any], timeout: float = 10.0):
+    pool["stop"].set()
+    for proc in pool["processes"]:
+        proc.join(timeout)
+        if proc.is_alive():
+            proc.terminate()
+
+
+def supervise(pool: Dict[str, Any]):
+    # Restarts crashed workers and periodically requeues jobs orphaned by them
+    store = JobStore(pool["db_path"])
+    while not pool["stop"].is_set():
+        recovered = store.requeue_stale()
+        if recovered:
+            logger.warning("Requeued %s stale job(s).", recovered)
+        for i, proc in enumerate(pool["processes"]):
+            if not proc.is_alive():
+                logger.warning("Job worker %s-%s exited (code %s); restarting.", pool["prefix"], i, proc.exitcode)
+                proc = pool["ctx"].Process(
+                    target=worker_loop, args=(f"{pool['prefix']}-{i}", pool["db_path"], pool["stop"]), daemon=True
+                )
+                proc.start()
+                pool["processes"][i] = proc
+        pool["stop"].wait(min(JOB_STALE_SEC / 4, 30.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background workers for the /jobs API.")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("JOB_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--db", default=JOBS_DB_PATH)
+    args = parser.parse_args()
+
+    setup_logging()
+    pool = start_worker_pool(args.processes, args.db)
+    logger.info("Started %s job worker(s) on %s.", args.processes, args.db,
+                extra={"pids": [p.pid for p in pool["processes"]]})
+    try:
+        supervise(pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_worker_pool(pool)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Benchmarks for the frame extraction pipeline (app.video_utils.extract_key_frames).
+
+Synthetic videos are generated locally with cv2.VideoWriter, so no fixtures
+are needed. Each case runs in a fresh process so peak RSS is per case.
+
+    python -m benchmarks.bench_extract_frames                  # quick matrix
+    python -m benchmarks.bench_extract_frames --full --repeat 3
+    python -m benchmarks.bench_extract_frames --compare before.json after.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import multiprocessing
+from itertools import product
+from typing import Dict, Any, List, Tuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+CACHE_DIR = os.path.join(RESULTS_DIR, "videos")
+
+# (container extension, fourcc)
+CODECS = {
+    "mp4v": (".mp4", "mp4v"),
+    "mjpg": (".avi", "MJPG"),
+    "h264": (".mp4", "avc1"),
+    "vp8": (".webm", "VP80"),
+}
+QUICK_MATRIX = {
+    "resolution": [(640, 360), (1280, 720), (1920, 1080)],
+    "fps": [30],
+    "duration_sec": [5],
+    "codec": ["mp4v", "mjpg"],
+}
+FULL_MATRIX = {
+    "resolution": [(640, 360), (1280, 720), (1920, 1080), (3840, 2160)],
+    "fps": [30, 60, 120],
+    "duration_sec": [5, 20],
+    "codec": list(CODECS),
+}
+
+
+# ------------------------
+# Synthetic video generation
+# ------------------------
+def make_video(width: int, height: int, fps: int, duration_sec: float, codec: str) -> Optional[str]:
+    # Textured "pool" background with a moving figure, so frames pass the detail screen
+    ext, fourcc = CODECS[codec]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{width}x{height}_{fps}fps_{duration_sec}s_{codec}{ext}")
+    if os.path.exists(path):
+        return path
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    if not writer.isOpened():
+        return None
+    rng = np.random.default_rng(0)
+    background = np.empty((height, width, 3), np.uint8)
+    background[:] = (170, 120, 40)
+    background = cv2.add(background, rng.integers(0, 40, (height, width, 3), dtype=np.uint8))
+    num_frames = int(fps * duration_sec)
+    for i in range(num_frames):
+        frame = background.copy()
+        phase = i / max(num_frames - 1, 1)
+        cx, cy = int(width * (0.2 + 0.6 * phase)), int(height * (0.7 - 0.4 * np.sin(np.pi * phase)))
+        cv2.ellipse(frame, (cx, cy), (width // 40, height // 6), 90 * phase, 0, 360, (60, 80, 200), -1)
+        cv2.line(frame, (0, height // 2), (width, height // 2), (230, 230, 230), max(1, height // 180))
+        writer.write(frame)
+    writer.release()
+    if os.path.getsize(path) == 0:
+        os.remove(path)
+        return None
+    return path
+
+
+# ------------------------
+# Measurement (runs in a child process)
+# ------------------------
+def _measure(path: str, queue):
+    from app.video_utils import extract_key_frames
+
+    start = time.perf_counter()
+    result = extract_key_frames(path)
+    elapsed = time.perf_counter() - start
+    payload = json.dumps({"frames": result["frames"]}).encode()
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss = maxrss if sys.platform == "darwin" else maxrss * 1024
+    queue.put({
+        "latency_sec": elapsed,
+        # What the decoder really decoded (keyframes mode skips most of the container)
+        "total_frames": result["total_frames"],
+        "frames_decoded": result["frames_decoded"],
+        "decoded_fps": result["frames_decoded"] / elapsed if elapsed else None,
+        "frames_kept": len(result["frames"]),
+        "payload_bytes": len(payload),
+        "peak_rss_bytes": peak_rss,
+    })
+
+
+def run_case(path: str) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(path, queue))
+    proc.start()
+    result = queue.get(timeout=600)
+    proc.join()
+    return result
+
+
+def run_matrix(matrix: Dict[str, List[Any]], repeat: int) -> List[Dict[str, Any]]:
+    cases = []
+    for (width, height), fps, duration, codec in product(*matrix.values()):
+        case = {"resolution": f"{width}x{height}", "fps": fps, "duration_sec": duration, "codec": codec}
+        path = make_video(width, height, fps, duration, codec)
+        if path is None:
+            print(f"skip {case}: codec not available in this OpenCV build")
+            continue
+        runs = [run_case(path) for _ in range(repeat)]
+        summary = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+        summary["input_bytes"] = os.path.getsize(path)
+        cases.append({**case, **summary})
+        print(f"{case['resolution']:>9} {fps:>3}fps {duration:>3}s {codec:<5} "
+              f"{summary['decoded_fps']:8.1f} frames/s  {summary['latency_sec']:6.3f}s  "
+              f"rss {summary['peak_rss_bytes'] / 2**20:6.1f} MiB  payload {summary['payload_bytes'] / 1024:7.1f} KiB")
+    return cases
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+# ------------------------
+# Comparing two result files
+# ------------------------
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def key(c) -> Tuple:
+        return (c["resolution"], c["fps"], c["duration_sec"], c["codec"])
+
+    old = {key(c): c for c in before["cases"]}
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for case in after["cases"]:
+        prev = old.get(key(case))
+        if not prev:
+            continue
+        deltas = []
+        for metric in ("latency_sec", "decoded_fps", "peak_rss_bytes", "payload_bytes"):
+            if prev[metric]:
+                deltas.append(f"{metric} {100 * (case[metric] - prev[metric]) / prev[metric]:+6.1f}%")
+        print(" ".join(str(k) for k in key(case)), " | ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame extraction on synthetic videos.")
+    parser.add_argument("--full", action="store_true", help="Run the full resolution/fps/duration/codec matrix")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case (median is reported)")
+    parser.add_argument("--out", help="Result JSON path (default: benchmarks/results/extract_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "cases": run_matrix(FULL_MATRIX if args.full else QUICK_MATRIX, args.repeat),
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"extract_{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Measure time-to-first-byte of a cold uvicorn boot, per startup mode.
+
+Starts `uvicorn main:app` in a fresh process, polls /healthz until it
+answers (time to first byte) and then /readyz until the warm-up is done.
+
+    python -m benchmarks.cold_start                        # lazy and eager, 3 boots each
+    python -m benchmarks.cold_start --modes lazy --runs 5 --json cold_start.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+from typing import Dict, Any, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL_SEC = 0.005
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def boot_once(mode: str, timeout: float = 60.0) -> Dict[str, Any]:
+    port = _free_port()
+    env = {**os.environ, "STARTUP_MODE": mode, "JOB_WORKERS": "0"}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        first_byte = ready = None
+        while time.perf_counter() - start < timeout:
+            if first_byte is None:
+                if _get(base + "/healthz") == 200:
+                    first_byte = time.perf_counter() - start
+            elif _get(base + "/readyz") == 200:
+                ready = time.perf_counter() - start
+                break
+            time.sleep(POLL_INTERVAL_SEC)
+        with urllib.request.urlopen(base + "/readyz", timeout=5) as response:
+            server_view = json.load(response)
+        return {"first_byte_sec": first_byte, "ready_sec": ready,
+                "server_first_response_sec": server_view.get("first_response_sec"),
+                "server_warmup_sec": server_view.get("warmup_sec")}
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time to first byte and readiness.")
+    parser.add_argument("--modes", nargs="+", default=["lazy", "eager"], choices=["lazy", "eager"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for mode in args.modes:
+        runs = [boot_once(mode) for _ in range(args.runs)]
+        report[mode] = {
+            "runs": runs,
+            "first_byte_sec_median": statistics.median(r["first_byte_sec"] for r in runs),
+            "ready_sec_median": statistics.median(r["ready_sec"] for r in runs),
+        }
+        print(f"{mode:>5}: first byte {report[mode]['first_byte_sec_median']:.3f}s, "
+              f"ready {report[mode]['ready_sec_median']:.3f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Replay a corpus of recorded judging requests through judge_frames.
+
+Corpus format (JSONL, one request per line):
+
+    {"figure_name": "301 Barracuda", "observations": "", "frames": ["<base64 jpeg>", ...],
+     "response": {"text": "...", "finish_reason": "STOP", "input_tokens": 2100,
+                  "output_tokens": 900, "latency_sec": 7.4}}
+
+"response" is the recorded model output used in stub mode; it is optional
+(a canned answer is used when missing) and is filled in by --record.
+
+    python -m benchmarks.replay_judging corpus.jsonl                     # offline stub
+    python -m benchmarks.replay_judging corpus.jsonl --backend live --repeats 3
+    python -m benchmarks.replay_judging corpus.jsonl --backend live --record recorded.jsonl
+    python -m benchmarks.replay_judging recorded.jsonl --guidelines new_judging.json --json after.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+
+# Replays must never end up in the coach-facing judgement history, and every
+# replay (repeats included) must reach the model instead of a cached or shared
+# result; this also keeps replays out of the production /dev/shm cache
+os.environ.setdefault("HISTORY_ENABLED", "0")
+os.environ.setdefault("CACHE_ENABLED", "0")
+os.environ.setdefault("SINGLE_FLIGHT", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+import main  # noqa: E402
+from app import llm_utils  # noqa: E402
+from app.history import parse_score  # noqa: E402
+
+# Gemini bills a (small) image as a fixed number of tokens
+TOKENS_PER_IMAGE = 258
+STUB_TEXT = "**Total Score:** 7.0 / 10\n\n<table><tr><th>Transition</th></tr></table>"
+
+
+# ------------------------
+# Backends (drop-in replacements for llm_utils.client)
+# ------------------------
+def _response(text: str, finish_reason: str, input_tokens: Optional[int], output_tokens: Optional[int]):
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name=finish_reason))],
+        usage_metadata=SimpleNamespace(prompt_token_count=input_tokens, candidates_token_count=output_tokens),
+    )
+
+
+class StubClient:
+    # Serves the recorded response of the request currently being replayed
+    def __init__(self, simulate_latency: bool = False):
+        self.models = self
+        self.simulate_latency = simulate_latency
+        self.current: Dict[str, Any] = {}
+        self.last_usage = (None, None)
+
+    def generate_content(self, model, contents, config=None):
+        recorded = self.current.get("response") or {}
+        text = recorded.get("text", STUB_TEXT)
+        prompt_chars = sum(len(c) for c in contents if isinstance(c, str))
+        num_images = sum(1 for c in contents if not isinstance(c, str))
+        input_tokens = recorded.get("input_tokens") or prompt_chars // 4 + num_images * TOKENS_PER_IMAGE
+        output_tokens = recorded.get("output_tokens") or len(text) // 4
+        if self.simulate_latency and recorded.get("latency_sec"):
+            time.sleep(recorded["latency_sec"])
+        self.last_usage = (input_tokens, output_tokens)
+        return _response(text, recorded.get("finish_reason", "STOP"), input_tokens, output_tokens)
+
+    def generate_content_stream(self, model, contents, config=None):
+        yield self.generate_content(model, contents, config)
+
+
+class RecordingClient:
+    # Wraps the real Gemini client and remembers what each call returned
+    def __init__(self, client):
+        self.client = client
+        self.models = self
+        self.last_usage = (None, None)
+        self.last_response: Dict[str, Any] = {}
+
+    def generate_content_stream(self, model, contents, config=None):
+        start = time.perf_counter()
+        text, finish_reason, usage = [], "UNKNOWN", None
+        for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+            text.append(chunk.text or "")
+            if chunk.candidates and chunk.candidates[0].finish_reason:
+                finish_reason = chunk.candidates[0].finish_reason.name
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        self.last_usage = (usage.prompt_token_count, usage.candidates_token_count) if usage else (None, None)
+        self.last_response = {
+            "text": "".join(text),
+            "finish_reason": finish_reason,
+            "input_tokens": self.last_usage[0],
+            "output_tokens": self.last_usage[1],
+            "latency_sec": round(time.perf_counter() - start, 3),
+        }
+
+
+# ------------------------
+# Replay & report
+# ------------------------
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    latencies = [s["latency_sec"] for s in samples]
+    scores = [s["score"] for s in samples if s["score"] is not None]
+    in_tokens = [s["input_tokens"] for s in samples if s["input_tokens"] is not None]
+    out_tokens = [s["output_tokens"] for s in samples if s["output_tokens"] is not None]
+    return {
+        "requests": len(samples),
+        "latency_p50_sec": percentile(latencies, 50),
+        "latency_p95_sec": percentile(latencies, 95),
+        "latency_p99_sec": percentile(latencies, 99),
+        "input_tokens_mean": statistics.fmean(in_tokens) if in_tokens else None,
+        "output_tokens_mean": statistics.fmean(out_tokens) if out_tokens else None,
+        "scores_parsed": len(scores),
+        "score_mean": statistics.fmean(scores) if scores else None,
+        "score_variance": statistics.pvariance(scores) if len(scores) > 1 else 0.0 if scores else None,
+    }
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(corpus: List[Dict[str, Any]], backend, repeats: int) -> List[Dict[str, Any]]:
+    samples = []
+    for idx, request in enumerate(corpus):
+        for _ in range(repeats):
+            if isinstance(backend, StubClient):
+                backend.current = request
+            start = time.perf_counter()
+            response = await main.judge_frames(
+                request=Request({"type": "http", "headers": []}),
+                figure_name=request["figure_name"],
+                observations=request.get("observations", ""),
+                frame_base64_json=json.dumps(request["frames"]),
+                athlete="",
+                timings=False,
+            )
+            latency = time.perf_counter() - start
+            output = json.loads(response.body).get("llm_output", "")
+            samples.append({
+                "request": idx,
+                "figure_name": request["figure_name"],
+                "latency_sec": latency,
+                "input_tokens": backend.last_usage[0],
+                "output_tokens": backend.last_usage[1],
+                "score": parse_score(output),
+            })
+            if isinstance(backend, RecordingClient):
+                request["response"] = backend.last_response
+    return samples
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Replay recorded judging requests and report latency/stability.")
+    parser.add_argument("corpus", help="JSONL corpus of recorded requests")
+    parser.add_argument("--backend", choices=["stub", "live"], default="stub")
+    parser.add_argument("--repeats", type=int, default=1, help="Times to replay each request (score stability)")
+    parser.add_argument("--simulate-latency", action="store_true", help="Stub mode: sleep for the recorded latency")
+    parser.add_argument("--record", metavar="PATH", help="Live mode: write the corpus with fresh responses to PATH")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    parser.add_argument("--guidelines", metavar="PATH", help="Judging guidelines to use instead of as_judging.json")
+    parser.add_argument("--model", help="Override MODEL_NAME for the live backend")
+    args = parser.parse_args()
+
+    if args.guidelines:
+        llm_utils.GUIDELINES_PATH = args.guidelines
+    if args.model:
+        llm_utils.MODEL_NAME = args.model
+
+    corpus = load_corpus(args.corpus)
+    if args.backend == "stub":
+        backend = StubClient(simulate_latency=args.simulate_latency)
+    else:
+        if not llm_utils.get_client():
+            sys.exit("Live backend requested but the Gemini client is not initialized. Check GEMINI_API_KEY.")
+        backend = RecordingClient(llm_utils.get_client())
+    llm_utils.client = backend
+
+    samples = asyncio.run(replay(corpus, backend, args.repeats))
+
+    by_figure: Dict[str, List[Dict[str, Any]]] = {}
+    for s in samples:
+        by_figure.setdefault(s["figure_name"], []).append(s)
+    report = {
+        "backend": args.backend,
+        "model": llm_utils.MODEL_NAME,
+        "guidelines": llm_utils.GUIDELINES_PATH,
+        "repeats": args.repeats,
+        "overall": summarize(samples),
+        "per_figure": {fig: summarize(group) for fig, group in sorted(by_figure.items())},
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.record:
+        with open(args.record, "w") as f:
+            for request in corpus:
+                f.write(json.dumps(request) + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
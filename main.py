@@ -1,62 +1,239 @@
 import os
-import cv2
-import tempfile
 import json
-import uuid
 import time
-import base64
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from typing import List, Dict, Any
-
-# --- GEMINI IMPORTS ---
-from google import genai
-from google.genai.errors import APIError
-from google.genai.types import Part
+from starlette.requests import ClientDisconnect
+from typing import List, Optional
+
+from app import llm_utils
+from app.llm_utils import run_judgement, judgement_key, with_history
+from app.video_utils import (
+    memory_video,
+    memory_file_path,
+    extract_key_frames,
+    extraction_settings,
+    encode_settings,
+    MAX_WIDTH,
+    TARGET_FRAMES,
+    MIN_DETAIL_STD,
+    ENCODE_QUALITY,
+)
+from app import frame_quality
+from app.frame_hash import DEDUP_ENABLED, DHASH_THRESHOLD, PHASH_THRESHOLD
+from app.measurements import WATER_HUE_MIN, WATER_HUE_MAX, WATER_SAT_MIN, WATER_VAL_MIN
+from app.cache import frame_cache, content_key, file_content_key
+from app.upload_forms import VideoUploadRoute
+from app.singleflight import frame_flight, judgement_flight
+from app.cancellation import (
+    EXTRACT_DEADLINE_SEC,
+    JUDGE_DEADLINE_SEC,
+    CANCELLED_REQUESTS,
+    CancelToken,
+    RequestCancelled,
+    cancel_scope,
+    cancelled_status,
+)
+from app.streaming import (
+    StreamPipe,
+    stream_layout,
+    stream_decoding_available,
+    extract_key_frames_from_stream,
+    STREAM_SNIFF_BYTES,
+)
+from app.routes import router as analyze_router
+from app.static_assets import FingerprintedStaticFiles, CachedPage
+from app.startup import start_warm_up, mark_first_response, state as startup_state, STARTUP_MODE
+from app.job_routes import router as jobs_router
+from app.history_routes import router as history_router
+from app.upload_routes import router as uploads_router
+from app.worker import start_worker_pool, stop_worker_pool, supervise
+from app.logging_utils import setup_logging, get_logger, request_id_var, new_request_id
+from app.limits import (
+    MAX_UPLOAD_BYTES,
+    LIMIT_REJECTIONS,
+    rate_limiter,
+    bucket_for,
+    limited_route,
+    upload_limit_for,
+    client_id,
+    retry_after_header,
+    error_content,
+)
+from app.metrics import (
+    StageTimer,
+    render_metrics,
+    record_peak_rss,
+    start_metrics_export,
+    BYTES_IN,
+    BYTES_OUT,
+    UPLOAD_BYTES,
+    FRAMES_DECODED,
+    FRAMES_KEPT,
+    FRAME_BYTES,
+    EXTRACTIONS_IN_FLIGHT,
+)
 
 # ------------------------
 # Config
 # ------------------------
-# --- GEMINI CLIENT SETUP ---
-try:
-    # Use api_key from environment, or let it fail cleanly
-    api_key = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
-except Exception as e:
-    print(f"Warning: Gemini client initialization failed. Is GEMINI_API_KEY set? Error: {e}")
-    client = None
-
-MODEL_NAME = "gemini-2.5-flash"
-# Increased for complex HTML output and multiple image inputs
-MAX_OUTPUT_TOKENS = 8000 
 STATIC_ROOT_DIR = os.path.join(os.getcwd(), "static")
 VIDEO_DIR = os.path.join(STATIC_ROOT_DIR, "videos")
 SAMPLE_VIDEO_PATH = "/static/videos/sample_video.mp4"
-
+# Background job workers started alongside the web app (0 = run `python -m app.worker` separately)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))
 # Ensure directories exist
 os.makedirs(VIDEO_DIR, exist_ok=True)
 
+setup_logging()
+logger = get_logger("app")
+
 
 # ------------------------
 # App setup
 # ------------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy imports + Gemini client: in the background (lazy) or right here (eager)
+    start_warm_up()
+    start_metrics_export()
+    pool = None
+    if JOB_WORKERS > 0:
+        pool = start_worker_pool(JOB_WORKERS)
+        threading.Thread(target=supervise, args=(pool,), daemon=True).start()
+        logger.info("Started %s embedded job worker(s).", JOB_WORKERS)
+    yield
+    if pool:
+        stop_worker_pool(pool)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# ------------------------
+# Per-request stage timing (Server-Timing headers)
+# ------------------------
+@app.middleware("http")
+async def stamp_request_start(request: Request, call_next):
+    # Taken when the headers arrive, before the body is received and parsed
+    request.state.received_at = time.perf_counter()
+    response = await call_next(request)
+    if startup_state["first_response_sec"] is None:
+        mark_first_response()
+    return response
+
+
+# ------------------------
+# Upload size + per-client rate limits
+# ------------------------
+@app.middleware("http")
+async def enforce_limits(request: Request, call_next):
+    # Runs before the body is read, so a rejected upload is never received
+    method, path = request.method, request.url.path
+    max_bytes = upload_limit_for(method, path)
+    content_length = request.headers.get("content-length", "")
+    if max_bytes and content_length.isdigit() and int(content_length) > max_bytes:
+        LIMIT_REJECTIONS.inc(limit="upload_bytes")
+        message = f"Upload is larger than the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit."
+        return JSONResponse(status_code=413, content=error_content(limited_route(method, path), message))
+
+    bucket = bucket_for(method, path)
+    if bucket:
+        client = client_id(request.headers, request.client.host if request.client else None)
+        retry_after = await run_in_threadpool(rate_limiter.take, bucket, client)
+        if retry_after:
+            wait = retry_after_header(retry_after)
+            return JSONResponse(status_code=429, headers={"Retry-After": wait}, content=error_content(
+                bucket, f"Rate limit exceeded; try again in {wait} s."))
+    return await call_next(request)
+
+
+# ------------------------
+# Request ids + access log
+# ------------------------
+# Registered after the other @app.middleware functions, so it wraps them and every
+# log line of the request carries the id
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        logger.info("%s %s %s", request.method, request.url.path, status, extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+        request_id_var.reset(token)
+
 
+# ------------------------
+# CORS
+# ------------------------
+# Added last so it is the outermost layer: responses produced by the middlewares
+# above (413/429 from enforce_limits) get the CORS headers too, and cross-origin
+# pages can read Retry-After and X-Request-ID
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
 
-# Only mount static directory for videos and HTML assets
-app.mount("/static", StaticFiles(directory=STATIC_ROOT_DIR), name="static")
 
-@app.get("/", response_class=HTMLResponse)
-def index():
+def request_timer(request: Request, endpoint: str) -> StageTimer:
+    timer = StageTimer(endpoint)
+    received_at = getattr(request.state, "received_at", None)
+    if received_at is not None:
+        # Body upload + multipart parsing happen before the handler runs
+        timer.started = received_at
+        timer.add("upload_receive", time.perf_counter() - received_at)
+    return timer
+
+
+def timed_response(content: dict, timer: StageTimer, include_timings: bool, status_code: int = 200) -> JSONResponse:
+    # Every response carries Server-Timing; the JSON `timings` object is opt-in (?timings=true)
+    if include_timings:
+        content = {**content, "timings": timer.as_dict()}
+    return JSONResponse(status_code=status_code, content=content, headers={
+        "Server-Timing": timer.server_timing(),
+        "Timing-Allow-Origin": "*",
+    })
+
+
+# Only mount static directory for videos and HTML assets.
+# Fingerprinted URLs (name.<hash>.ext) are served with immutable cache headers.
+static_files = FingerprintedStaticFiles(directory=STATIC_ROOT_DIR)
+app.mount("/static", static_files, name="static")
+
+# Two-video comparison endpoint (/analyze)
+app.include_router(analyze_router)
+# Asynchronous job API (/jobs/...) for long-running extraction and judging
+app.include_router(jobs_router)
+# Judgement history and trend queries (/history/...)
+app.include_router(history_router)
+# Resumable chunked uploads (/uploads/...) that finish into frame extraction
+app.include_router(uploads_router)
+
+# ------------------------
+# Index page (rendered once at startup)
+# ------------------------
+def render_index_html() -> str:
+    logo_url = static_files.url_for("videos/Judging bot title.png")
+    sample_video_url = static_files.url_for(SAMPLE_VIDEO_PATH.removeprefix("/static/"))
     return f"""
     <!DOCTYPE html>
     <html>
@@ -184,7 +361,7 @@ def index():
                 margin-bottom: 20px;
             }}
             /* Specific style for the checkbox/label group */
-            #sampleGroup {{
+            #sampleGroup, #browserExtractGroup {{
                 display: flex;
                 align-items: center;
                 gap: 5px;
@@ -225,6 +402,13 @@ def index():
             #figureSelect {{
                 width: 250px;
             }}
+            #athleteInput {{
+                width: 200px;
+                padding: 10px;
+                border: 1px solid #ccc;
+                border-radius: 4px;
+                margin-bottom: 10px;
+            }}
             #sampleVideoPlayer {{
                 width: 100%;
                 max-width: 400px;
@@ -244,12 +428,12 @@ def index():
     </head>
     <body>
     <div class="container">
-        <img id="headerLogo" src="/static/videos/Judging bot title.png" alt="Artistic Swimming Judging Bot Title"/>
+        <img id="headerLogo" src="{logo_url}" alt="Artistic Swimming Judging Bot Title"/>
 
         <h2>Upload Video 🎥</h2>
         
         <video id="sampleVideoPlayer" controls>
-            <source src="{SAMPLE_VIDEO_PATH}" type="video/mp4">
+            <source src="{sample_video_url}" type="video/mp4">
             Your browser does not support the video tag.
         </video>
 
@@ -264,6 +448,11 @@ def index():
                 <input type="file" id="videoInput" accept="video/*" style="margin-bottom: 0; width: auto;">
             </div>
 
+            <div id="browserExtractGroup">
+                <input type="checkbox" id="browserExtractCheck" checked>
+                <label for="browserExtractCheck">Extract frames on this device (only the selected frames are uploaded)</label>
+            </div>
+
             <button id="processBtn" disabled style="margin-left: 0; margin-top: 10px; width: 300px;">
                 Process Video
             </button>
@@ -279,6 +468,7 @@ def index():
         
         <h3>Select Figure & Judge</h3>
         <div class="control-group">
+            <input type="text" id="athleteInput" placeholder="Athlete name (optional)">
             <select id="figureSelect">
                 <optgroup label="100 Series – Novice / Basic Figures">
                     <option value="101 Front Layout">101 Front Layout</option>
@@ -396,6 +586,27 @@ def index():
         const useSampleCheck = document.getElementById("useSampleCheck");
         const processBtn = document.getElementById("processBtn");
         const serverResponse = document.getElementById("serverResponse");
+        const browserExtractCheck = document.getElementById("browserExtractCheck");
+
+        // Same settings as the server-side extractor
+        const MAX_WIDTH = {MAX_WIDTH};
+        const TARGET_FRAMES = {TARGET_FRAMES};
+        const MIN_DETAIL_STD = {MIN_DETAIL_STD};
+        // Same scoring as app/frame_quality.py
+        const QUALITY = {{
+            width: {frame_quality.QUALITY_WIDTH}, sharpnessRef: {frame_quality.SHARPNESS_REF},
+            clipLow: {frame_quality.CLIP_LOW}, clipHigh: {frame_quality.CLIP_HIGH},
+            maxClipped: {frame_quality.MAX_CLIPPED}, maxSplash: {frame_quality.MAX_SPLASH},
+            foamMaxSat: {frame_quality.FOAM_MAX_SAT}, foamMinVal: {frame_quality.FOAM_MIN_VAL},
+            waterRowMin: {frame_quality.WATER_ROW_MIN},
+            waterHue: [{WATER_HUE_MIN}, {WATER_HUE_MAX}], waterSatMin: {WATER_SAT_MIN}, waterValMin: {WATER_VAL_MIN},
+        }};
+        // Same near-duplicate test as app/frame_hash.py
+        const DEDUP = {{ enabled: {str(DEDUP_ENABLED).lower()}, dhash: {DHASH_THRESHOLD}, phash: {PHASH_THRESHOLD} }};
+        const JPEG_QUALITY = {ENCODE_QUALITY / 100};
+        const SAMPLE_POINTS = 10;
+        // Videos larger than this are uploaded in resumable chunks
+        const RESUMABLE_MIN_BYTES = 8 * 1024 * 1024;
 
 
         // --- CORE FUNCTION: Checks state and enables the Process button ---
@@ -415,6 +626,277 @@ def index():
             }}
         }}
 
+        // --- Browser-side extraction (no video upload) ---
+        function waitForEvent(target, eventName, timeoutMs) {{
+            return new Promise((resolve, reject) => {{
+                const timer = setTimeout(() => reject(new Error(`Timed out waiting for ${{eventName}}`)), timeoutMs);
+                target.addEventListener(eventName, () => {{ clearTimeout(timer); resolve(); }}, {{ once: true }});
+                target.addEventListener("error", () => {{ clearTimeout(timer); reject(new Error("Video cannot be decoded in this browser")); }}, {{ once: true }});
+            }});
+        }}
+
+        function grayPixels(imageData) {{
+            // Same weights and rounding as OpenCV's BGR2GRAY
+            const px = imageData.data;
+            const gray = new Float32Array(px.length / 4);
+            for (let i = 0, j = 0; i < px.length; i += 4, j++) {{
+                gray[j] = Math.round(0.299 * px[i] + 0.587 * px[i + 1] + 0.114 * px[i + 2]);
+            }}
+            return gray;
+        }}
+
+        function stdOf(values) {{
+            let sum = 0, sumSq = 0;
+            for (const v of values) {{ sum += v; sumSq += v * v; }}
+            const mean = sum / values.length;
+            return Math.sqrt(Math.max(sumSq / values.length - mean * mean, 0));
+        }}
+
+        function hsvPixel(r, g, b) {{
+            // OpenCV 8-bit HSV: H in 0-180, S and V in 0-255
+            const v = Math.max(r, g, b), diff = v - Math.min(r, g, b);
+            const s = v ? Math.round(255 * diff / v) : 0;
+            let h = 0;
+            if (diff) {{
+                h = v === r ? 60 * (g - b) / diff : v === g ? 120 + 60 * (b - r) / diff : 240 + 60 * (r - g) / diff;
+                if (h < 0) h += 360;
+            }}
+            return [Math.round(h / 2), s, v];
+        }}
+
+        function frameQuality(imageData, detail) {{
+            // Port of score_frames() for one QUALITY.width thumbnail: sharpness
+            // (Laplacian variance), exposure clipping and splash share of the water.
+            // `detail` (the blank-frame std) comes from the MAX_WIDTH frame: the
+            // thumbnail is too smooth for MIN_DETAIL_STD
+            const {{ width, height, data }} = imageData;
+            const gray = grayPixels(imageData);
+            const lap = [];
+            for (let y = 1; y < height - 1; y++) {{
+                for (let x = 1; x < width - 1; x++) {{
+                    const i = y * width + x;
+                    lap.push(4 * gray[i] - gray[i - width] - gray[i + width] - gray[i - 1] - gray[i + 1]);
+                }}
+            }}
+            const sharpness = stdOf(lap) ** 2;
+            let clippedPx = 0;
+            for (const g of gray) if (g <= QUALITY.clipLow || g >= QUALITY.clipHigh) clippedPx++;
+            const clipped = clippedPx / gray.length;
+
+            let waterPx = 0, foamPx = 0;
+            for (let y = 0; y < height; y++) {{
+                let rowWater = 0, rowFoam = 0;
+                for (let x = 0; x < width; x++) {{
+                    const i = (y * width + x) * 4;
+                    const [h, s, v] = hsvPixel(data[i], data[i + 1], data[i + 2]);
+                    if (h >= QUALITY.waterHue[0] && h <= QUALITY.waterHue[1] && s >= QUALITY.waterSatMin && v >= QUALITY.waterValMin) rowWater++;
+                    else if (s <= QUALITY.foamMaxSat && v >= QUALITY.foamMinVal) rowFoam++;
+                }}
+                waterPx += rowWater;
+                // Only rows that show the pool count, so a white wall or sky isn't "foam"
+                if (rowWater / width >= QUALITY.waterRowMin) foamPx += rowFoam;
+            }}
+            const splash = waterPx + foamPx > 0 ? foamPx / (waterPx + foamPx) : 0;
+            return {{
+                score: Math.min(1, sharpness / QUALITY.sharpnessRef) * (1 - clipped) * (1 - splash),
+                usable: detail >= MIN_DETAIL_STD && clipped <= QUALITY.maxClipped && splash <= QUALITY.maxSplash,
+            }};
+        }}
+
+        function areaResize(gray, width, height, outW, outH) {{
+            // Box-filter downscale like cv2.INTER_AREA: each output pixel averages the
+            // source area it covers, partially covered pixels weighted by coverage.
+            // Rows first, then columns.
+            const spans = (inSize, outSize) => Array.from({{ length: outSize }}, (_, o) => {{
+                const scale = inSize / outSize, from = o * scale, to = (o + 1) * scale;
+                const span = [];
+                for (let i = Math.floor(from); i < Math.min(inSize, Math.ceil(to)); i++) {{
+                    span.push([i, (Math.min(i + 1, to) - Math.max(i, from)) / scale]);
+                }}
+                return span;
+            }});
+            const xs = spans(width, outW), ys = spans(height, outH);
+            const rows = new Float32Array(height * outW);
+            for (let y = 0; y < height; y++) {{
+                for (let ox = 0; ox < outW; ox++) {{
+                    for (const [x, w] of xs[ox]) rows[y * outW + ox] += w * gray[y * width + x];
+                }}
+            }}
+            const out = new Float32Array(outW * outH);
+            for (let oy = 0; oy < outH; oy++) {{
+                for (const [y, w] of ys[oy]) {{
+                    for (let ox = 0; ox < outW; ox++) out[oy * outW + ox] += w * rows[y * outW + ox];
+                }}
+            }}
+            return out.map(Math.round);
+        }}
+
+        function frameHashes(imageData) {{
+            // dHash (9x8 horizontal gradients) and pHash (signs of the 8x8 lowest DCT
+            // frequencies of a 32x32 thumbnail), 64 booleans each
+            const gray = grayPixels(imageData);
+            const {{ width, height }} = imageData;
+            const small = areaResize(gray, width, height, 9, 8);
+            const dhash = [];
+            for (let y = 0; y < 8; y++) for (let x = 0; x < 8; x++) dhash.push(small[y * 9 + x + 1] > small[y * 9 + x]);
+
+            const N = 32;
+            const thumb = areaResize(gray, width, height, N, N);
+            const dct = (k, n) => Math.cos(Math.PI * (2 * n + 1) * k / (2 * N)) * Math.sqrt(2 / N) * (k ? 1 : Math.SQRT1_2);
+            const low = [];
+            for (let u = 0; u < 8; u++) {{
+                for (let v = 0; v < 8; v++) {{
+                    let sum = 0;
+                    for (let y = 0; y < N; y++) {{
+                        let row = 0;
+                        for (let x = 0; x < N; x++) row += thumb[y * N + x] * dct(v, x);
+                        sum += dct(u, y) * row;
+                    }}
+                    low.push(sum);
+                }}
+            }}
+            // The DC term only carries brightness; compare against the median of the rest
+            const rest = low.slice(1).sort((a, b) => a - b);
+            const median = rest[(rest.length - 1) >> 1];
+            return {{ dhash, phash: low.map(value => value > median) }};
+        }}
+
+        function nearDuplicate(a, b) {{
+            const distance = (x, y) => x.reduce((n, bit, i) => n + (bit !== y[i]), 0);
+            return distance(a.dhash, b.dhash) <= DEDUP.dhash && distance(a.phash, b.phash) <= DEDUP.phash;
+        }}
+
+        async function extractFramesInBrowser(file) {{
+            // Seeks a hidden <video> to SAMPLE_POINTS evenly spaced times, scores them like
+            // the server (app/frame_quality.py) and keeps the best TARGET_FRAMES usable
+            // frames that aren't near-duplicates of a better one, in time order, as JPEGs.
+            // Throws when the browser can't decode the video, so the caller can fall back.
+            const url = URL.createObjectURL(file);
+            const video = document.createElement("video");
+            video.muted = true;
+            video.playsInline = true;
+            video.preload = "auto";
+            try {{
+                const loaded = waitForEvent(video, "loadeddata", 10000);
+                video.src = url;
+                await loaded;
+                if (!video.videoWidth || !isFinite(video.duration) || video.duration <= 0) {{
+                    throw new Error("Video has no decodable picture");
+                }}
+
+                const scale = Math.min(1, MAX_WIDTH / video.videoWidth);
+                const canvas = document.createElement("canvas");
+                canvas.width = Math.round(video.videoWidth * scale);
+                canvas.height = Math.round(video.videoHeight * scale);
+                const ctx = canvas.getContext("2d", {{ willReadFrequently: true }});
+                const thumb = document.createElement("canvas");
+                thumb.width = QUALITY.width;
+                thumb.height = Math.max(8, Math.round(video.videoHeight * QUALITY.width / video.videoWidth));
+                const thumbCtx = thumb.getContext("2d", {{ willReadFrequently: true }});
+
+                const candidates = [];
+                let maxStd = 0;
+                for (let i = 0; i < SAMPLE_POINTS; i++) {{
+                    const t = Math.min(video.duration * i / SAMPLE_POINTS, video.duration - 0.05);
+                    const seeked = waitForEvent(video, "seeked", 5000);
+                    video.currentTime = Math.max(t, 0);
+                    await seeked;
+
+                    thumbCtx.drawImage(video, 0, 0, thumb.width, thumb.height);
+                    const pixels = thumbCtx.getImageData(0, 0, thumb.width, thumb.height);
+                    ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+                    const detail = stdOf(grayPixels(ctx.getImageData(0, 0, canvas.width, canvas.height)));
+                    maxStd = Math.max(maxStd, detail);
+                    const quality = frameQuality(pixels, detail);
+                    if (quality.usable) {{
+                        const dataUrl = canvas.toDataURL("image/jpeg", JPEG_QUALITY);
+                        candidates.push({{
+                            score: quality.score,
+                            hashes: DEDUP.enabled ? frameHashes(pixels) : null,
+                            base64_data: dataUrl.slice(dataUrl.indexOf(",") + 1),
+                            mime_type: "image/jpeg",
+                            timestamp_sec: Math.round(t * 100) / 100,
+                        }});
+                    }}
+                }}
+                // Some browsers "play" unsupported codecs as blank frames
+                if (maxStd < 1) throw new Error("Browser decoded only blank frames");
+                // Best first, skipping near-duplicates of a frame already kept (e.g. a
+                // held vertical), then the kept ones back in time order
+                candidates.sort((a, b) => b.score - a.score);
+                const kept = [];
+                for (const frame of candidates) {{
+                    if (kept.length >= TARGET_FRAMES) break;
+                    if (!DEDUP.enabled || !kept.some(other => nearDuplicate(frame.hashes, other.hashes))) kept.push(frame);
+                }}
+                return kept
+                    .sort((a, b) => a.timestamp_sec - b.timestamp_sec)
+                    .map(({{ score, hashes, ...frame }}) => frame);
+            }} finally {{
+                video.removeAttribute("src");
+                video.load();
+                URL.revokeObjectURL(url);
+            }}
+        }}
+
+        const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+        async function uploadResumable(file, onProgress) {{
+            // Sends the file in chunks; after a network error it asks the server how
+            // much arrived and continues from there instead of starting over.
+            const createForm = new FormData();
+            createForm.append("size", file.size);
+            createForm.append("filename", file.name || "video.mp4");
+            const created = await (await fetch("/uploads", {{ method: "POST", body: createForm }})).json();
+            if (!created.upload_id) throw new Error(created.message || "Could not start upload");
+
+            let offset = 0;
+            let failures = 0;
+            while (offset < file.size) {{
+                const chunk = file.slice(offset, offset + created.chunk_size);
+                try {{
+                    const res = await fetch(`/uploads/${{created.upload_id}}?offset=${{offset}}`, {{ method: "PUT", body: chunk }});
+                    const data = await res.json();
+                    if (!res.ok && res.status !== 409) {{
+                        // Rejected by the server (not a network problem): retrying won't help
+                        const error = new Error(data.message || `Upload failed (${{res.status}})`);
+                        error.fatal = true;
+                        throw error;
+                    }}
+                    offset = data.offset;  // 409 also reports the server's offset
+                    failures = 0;
+                    onProgress(offset / file.size);
+                }} catch (e) {{
+                    if (e.fatal || ++failures > 8) throw e;
+                    await sleep(Math.min(1000 * 2 ** failures, 30000));
+                    try {{
+                        const status = await (await fetch(`/uploads/${{created.upload_id}}`)).json();
+                        if (typeof status.offset === "number") offset = status.offset;
+                    }} catch (_) {{ /* still offline; retry the same chunk */ }}
+                }}
+            }}
+            return created.upload_id;
+        }}
+
+        async function extractFramesOnServer(file) {{
+            if (file.size >= RESUMABLE_MIN_BYTES) {{
+                const uploadId = await uploadResumable(file, (fraction) => {{
+                    processBtn.textContent = `Uploading... ${{Math.round(fraction * 100)}}%`;
+                }});
+                processBtn.textContent = 'Extracting key frames...';
+                const res = await fetch(`/uploads/${{uploadId}}/finalize`, {{ method: "POST" }});
+                const data = await res.json();
+                // Over a size/duration limit or rate limited (429 comes with Retry-After)
+                if (!res.ok) throw new Error(data.message || res.statusText);
+                return data.frames || [];
+            }}
+            // Raw body: the server starts decoding while the upload is still in flight
+            const res = await fetch("/extract_frames/stream", {{ method:"POST", body: file }});
+            const data = await res.json();
+            if (!res.ok) throw new Error(data.message || res.statusText);
+            return data.frames || [];
+        }}
+
         // --- CORE FUNCTION: Extracts frames and renders them ---
         async function runFrameExtraction(fileToProcess) {{
             if (!fileToProcess) {{ 
@@ -427,18 +909,26 @@ def index():
             processBtn.textContent = 'Extracting key frames...'; // Update button text
             serverResponse.innerHTML = "<h3>⏳ Extracting key frames from video... please wait.</h3>";
 
-            const formData = new FormData();
-            formData.append("video", fileToProcess);
-
             try {{
-                const res = await fetch("/extract_frames", {{ method:"POST", body: formData }});
-                const data = await res.json();
+                let frames = null;
+                if (browserExtractCheck.checked) {{
+                    try {{
+                        frames = await extractFramesInBrowser(fileToProcess);
+                    }} catch (e) {{
+                        // Unsupported codec/container: let the server decode it instead
+                        console.warn("Browser extraction failed, uploading the video instead:", e);
+                        serverResponse.innerHTML = "<h3>⏳ This browser can't read the video; uploading it for extraction... please wait.</h3>";
+                    }}
+                }}
+                if (frames === null) {{
+                    frames = await extractFramesOnServer(fileToProcess);
+                }}
 
                 // ** END LOADING STATE **
                 processBtn.disabled = false;
                 processBtn.textContent = 'Process Video'; // Restore button text
 
-                extractedFrames = data.frames || [];
+                extractedFrames = frames;
                 selectedFrameIndices.clear(); 
                 renderFrames();
                 serverResponse.innerHTML = "Frames extracted. Select key frames using the 'Select' button and press 'Send to Judging Bot' to continue.";
@@ -463,7 +953,7 @@ def index():
                 // Logic for fetching the sample video
                 serverResponse.innerHTML = "Loading sample video file...";
                 try {{
-                    const response = await fetch('{SAMPLE_VIDEO_PATH}');
+                    const response = await fetch('{sample_video_url}');
                     const blob = await response.blob();
                     fileToProcess = new File([blob], "sample_video.mp4", {{type: "video/mp4"}});
                 }} catch (e) {{
@@ -496,7 +986,7 @@ def index():
                 
                 // Use Base64 data URI as the image source
                 div.innerHTML = `
-                    <img src="data:image/jpeg;base64,${{f.base64_data}}" /> 
+                    <img src="data:${{f.mime_type || 'image/jpeg'}};base64,${{f.base64_data}}" /> 
                     <div class="frame-info">Time: ${{f.timestamp_sec}}s</div> 
                     <button id="focus-btn-${{idx}}" class="focus-btn" onclick="toggleFrameFocus(${{idx}})">Select</button>
                 `;
@@ -542,6 +1032,7 @@ def index():
             const formData = new FormData();
             formData.append("figure_name", document.getElementById("figureSelect").value);
             formData.append("frame_base64_json", JSON.stringify(selectedBase64Data));
+            formData.append("athlete", document.getElementById("athleteInput").value);
 
             try {{
                 const res = await fetch("/judge_base64_frames", {{ method:"POST", body: formData }});
@@ -572,72 +1063,194 @@ def index():
     </body>
     </html>
     """
+
+
+INDEX_PAGE = CachedPage(render_index_html())
+
+
+@app.get("/", response_class=HTMLResponse)
+def index(request: Request):
+    # ETag/304 handling and gzip/brotli variants come from the cached page
+    return INDEX_PAGE.response(request)
+
+
 # ------------------------
 # Extract frames Endpoint (Base64 Output)
 # ------------------------
-@app.post("/extract_frames")
-async def extract_frames(video: UploadFile = File(...)):
-    # Use temporary file to process video (necessary with cv2)
-    fd, path = tempfile.mkstemp(suffix=".mp4")
+# The upload is parsed straight into a memory file (app.upload_forms), never read into bytes
+video_router = APIRouter(route_class=VideoUploadRoute)
+
+
+@video_router.post("/extract_frames")
+async def extract_frames(request: Request, video: UploadFile = File(...), timings: bool = False,
+                         image_format: Optional[str] = None, quality: Optional[int] = None,
+                         max_frame_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None):
+    # Query options override ENCODE_FORMAT / ENCODE_QUALITY / MAX_FRAME_BYTES / MAX_PAYLOAD_BYTES
+    timer = request_timer(request, "extract_frames")
+    status = 200
     try:
-        with os.fdopen(fd, "wb") as f:
-            f.write(await video.read())
-
-        cap = cv2.VideoCapture(path)
-        if not cap.isOpened():
-            return JSONResponse(status_code=400, content={"frames": [], "message": "Could not open video file."})
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        MAX_WIDTH = 800
-        target_frames = 6
-        step = max(1, total_frames // 10)
-
-        frames = []
-        count = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-
-            if count % step == 0:
-                # Simple motion/detail check
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                if gray.std() >= 10:
-
-                    # --- RESIZE LOGIC ---
-                    height, width = frame.shape[:2]
-                    resized_frame = frame
-                    if width > MAX_WIDTH:
-                        ratio = MAX_WIDTH / width
-                        new_width = MAX_WIDTH
-                        new_height = int(height * ratio)
-                        resized_frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
-
-                    # Encode resized frame to JPEG bytes with compression 75
-                    encode_param = [cv2.IMWRITE_JPEG_QUALITY, 75]
-                    _, buffer = cv2.imencode('.jpg', resized_frame, encode_param)
-                    
-                    # Convert bytes to Base64 string
-                    base64_encoded = base64.b64encode(buffer).decode('utf-8')
-
-                    frames_data = {
-                        "base64_data": base64_encoded,
-                        "timestamp_sec": round(count/fps, 2)
-                    }
-
-                    # --- SLIDING WINDOW LOGIC (Keeps the latest `target_frames` frames) ---
-                    if len(frames) >= target_frames:
-                        frames.pop(0) 
-                    frames.append(frames_data)
-                    # --- END SLIDING WINDOW LOGIC ---
-
-            count += 1
+        encoding = encode_settings(image_format, quality, max_frame_bytes, max_total_bytes)
+    except ValueError as e:
+        status = 400
+        timer.observe(status)
+        return timed_response({"frames": [], "message": str(e)}, timer, timings, status)
+    try:
+        with EXTRACTIONS_IN_FLIGHT.track():
+            path = memory_file_path(video.file)
+            BYTES_IN.inc(video.size, endpoint="extract_frames")
+            UPLOAD_BYTES.observe(video.size, endpoint="extract_frames")
+
+            # Same video already extracted by any worker on this host?
+            with timer.stage("cache_lookup"):
+                cache_key = await run_in_threadpool(file_content_key, path, "extract_frames",
+                                                   extraction_settings(encoding))
+                cached = await run_in_threadpool(frame_cache.get, cache_key)
+            if cached is not None:
+                return timed_response({"frames": cached, "cached": True}, timer, timings)
+
+            async def extract():
+                result = await run_in_threadpool(extract_key_frames, path, timer=timer,
+                                                 encoding=encoding, cancel=cancel)
+                await run_in_threadpool(frame_cache.set, cache_key, result["frames"])
+                FRAMES_DECODED.inc(result["frames_decoded"])
+                FRAMES_KEPT.inc(len(result["frames"]))
+                return result["frames"]
+
+            # The same video being extracted right now (double submit, a class on the
+            # sample video)? Wait for that result instead of decoding it again.
+            # Stop decoding if the client gives up or the deadline passes
+            started = time.perf_counter()
+            try:
+                async with cancel_scope(request, EXTRACT_DEADLINE_SEC) as cancel:
+                    frames, shared = await frame_flight.do(cache_key, extract)
+            except RequestCancelled as e:
+                CANCELLED_REQUESTS.inc(endpoint="extract_frames", reason=e.reason)
+                status = cancelled_status(e.reason)
+                return timed_response({"frames": [], "message": f"Extraction cancelled ({e.reason})."},
+                                      timer, timings, status)
+            except ValueError as e:
+                status = 400
+                return timed_response({"frames": [], "message": str(e)}, timer, timings, status)
+            if shared:
+                timer.add("coalesced_wait", time.perf_counter() - started)
+
+        for frame in frames:
+            FRAME_BYTES.observe(frame["encoded_bytes"], mime_type=frame["mime_type"])
+        BYTES_OUT.inc(sum(len(f["base64_data"]) for f in frames), endpoint="extract_frames")
+        content = {"frames": frames, "coalesced": True} if shared else {"frames": frames}
+        return timed_response(content, timer, timings)
+    except Exception:
+        status = 500
+        raise
     finally:
-        cap.release()
-        os.remove(path)
-        
-    return {"frames": frames}
+        timer.observe(status)
+
+
+app.include_router(video_router)
+
+
+# ------------------------
+# Extract frames while uploading (raw body, decode overlaps the upload)
+# ------------------------
+@app.post("/extract_frames/stream")
+async def extract_frames_stream(request: Request, timings: bool = False,
+                                image_format: Optional[str] = None, quality: Optional[int] = None,
+                                max_frame_bytes: Optional[int] = None, max_total_bytes: Optional[int] = None):
+    # Body is the raw video (e.g. fetch(url, {method: "POST", body: file})), not multipart.
+    # Streamable containers are decoded while the body is still arriving, so latency is
+    # about max(upload, decode); MP4s with the index at the end are buffered and
+    # decoded like /extract_frames.
+    timer = request_timer(request, "extract_frames_stream")
+    status = 200
+    try:
+        encoding = encode_settings(image_format, quality, max_frame_bytes, max_total_bytes)
+    except ValueError as e:
+        status = 400
+        timer.observe(status)
+        return timed_response({"frames": [], "message": str(e)}, timer, timings, status)
+
+    pipe = StreamPipe()
+    # Deadline runs from the start of the upload; disconnects are watched once it's read
+    cancel = CancelToken(EXTRACT_DEADLINE_SEC)
+    decode_task = None
+    sniffed = False
+    try:
+        with EXTRACTIONS_IN_FLIGHT.track():
+            with timer.stage("upload_receive"):
+                try:
+                    async for chunk in request.stream():
+                        pipe.feed(chunk)
+                        if MAX_UPLOAD_BYTES and len(pipe) > MAX_UPLOAD_BYTES:
+                            # Chunked bodies have no Content-Length for the middleware to check
+                            break
+                        if not sniffed and len(pipe) >= STREAM_SNIFF_BYTES:
+                            sniffed = True
+                            layout = stream_layout(pipe.head()) if stream_decoding_available() else None
+                            if layout is not None:
+                                decode_task = asyncio.ensure_future(run_in_threadpool(
+                                    extract_key_frames_from_stream, pipe, layout, timer, encoding, cancel))
+                except ClientDisconnect:
+                    pipe.abort(ConnectionAbortedError("Client disconnected during upload."))
+                    if decode_task is not None:
+                        await asyncio.gather(decode_task, return_exceptions=True)
+                    raise
+                if MAX_UPLOAD_BYTES and len(pipe) > MAX_UPLOAD_BYTES:
+                    pipe.abort(ConnectionAbortedError("Upload over the size limit."))
+                    if decode_task is not None:
+                        await asyncio.gather(decode_task, return_exceptions=True)
+                    LIMIT_REJECTIONS.inc(limit="upload_bytes")
+                    status = 413
+                    return timed_response({"frames": [], "message": f"Upload is larger than the "
+                                           f"{MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit."}, timer, timings, status)
+                pipe.close()
+            BYTES_IN.inc(len(pipe), endpoint="extract_frames_stream")
+            UPLOAD_BYTES.observe(len(pipe), endpoint="extract_frames_stream")
+
+            try:
+                async with cancel_scope(request, token=cancel):
+                    result = None
+                    if decode_task is not None:
+                        try:
+                            result = await decode_task
+                        except ValueError as e:
+                            logger.info("Streaming decode failed (%s); decoding the buffered upload.", e)
+
+                    if result is None:
+                        data = pipe.getbuffer()
+                        with timer.stage("cache_lookup"):
+                            cache_key = await run_in_threadpool(content_key, "extract_frames",
+                                                               extraction_settings(encoding), data)
+                            cached = await run_in_threadpool(frame_cache.get, cache_key)
+                        if cached is not None:
+                            return timed_response({"frames": cached, "cached": True}, timer, timings)
+                        try:
+                            with memory_video(data) as path:
+                                # The memory file is now the only copy of the upload
+                                data.release()
+                                pipe.discard()
+                                result = await run_in_threadpool(extract_key_frames, path, timer=timer,
+                                                                 encoding=encoding, cancel=cancel)
+                        except ValueError as e:
+                            status = 400
+                            return timed_response({"frames": [], "message": str(e)}, timer, timings, status)
+                        await run_in_threadpool(frame_cache.set, cache_key, result["frames"])
+            except RequestCancelled as e:
+                CANCELLED_REQUESTS.inc(endpoint="extract_frames_stream", reason=e.reason)
+                status = cancelled_status(e.reason)
+                return timed_response({"frames": [], "message": f"Extraction cancelled ({e.reason})."},
+                                      timer, timings, status)
+
+        FRAMES_DECODED.inc(result["frames_decoded"])
+        FRAMES_KEPT.inc(len(result["frames"]))
+        for frame in result["frames"]:
+            FRAME_BYTES.observe(frame["encoded_bytes"], mime_type=frame["mime_type"])
+        BYTES_OUT.inc(sum(len(f["base64_data"]) for f in result["frames"]), endpoint="extract_frames_stream")
+        return timed_response({"frames": result["frames"], "streamed": decode_task is not None}, timer, timings)
+    except Exception:
+        status = 500
+        raise
+    finally:
+        timer.observe(status)
 
 
 # ------------------------
@@ -645,96 +1258,84 @@ async def extract_frames(video: UploadFile = File(...)):
 # ------------------------
 @app.post("/judge_base64_frames")
 async def judge_frames(
+    request: Request,
     figure_name: str = Form(...),
     observations: str = Form(""),
-    frame_base64_json: str = Form(...) # Now expects Base64 strings
+    frame_base64_json: str = Form(...), # Now expects Base64 strings
+    athlete: str = Form(""),
+    timings: bool = False
 ):
-    global client
-    if not client:
+    # In lazy startup mode this can wait on the warm-up importing google.genai: keep it off the loop
+    if not await run_in_threadpool(llm_utils.get_client):
         return JSONResponse(status_code=500, content={"llm_output": "Error: Gemini client not initialized. Check GEMINI_API_KEY."})
-    
-    frame_base64_list: List[str] = json.loads(frame_base64_json)
 
-    # Load prompt template from JSON file (retained for structured judging)
+    timer = request_timer(request, "judge_base64_frames")
+    status = 200
+    BYTES_IN.inc(len(frame_base64_json), endpoint="judge_base64_frames")
+    # A bad frame list is the client's fault (400), unlike bad guidelines below (500)
     try:
-        with open("as_judging.json") as f:
-            prompt_template = json.load(f)
-    except FileNotFoundError:
-        print("WARNING: as_judging.json not found. Using default guidelines.")
-        prompt_template = {"content": "Apply standard Artistic Swimming rules for technical execution and scoring."}
-    except json.JSONDecodeError as e:
-        return JSONResponse(status_code=500, content={"llm_output": f"Error: Invalid JSON in as_judging.json: {e}"})
-
-    # 1. Prepare text prompt and image data
-    gemini_content: List[Any] = []
-    
-    prompt_text = (
-        f"You are an expert Artistic Swimming judge. Analyze the sequence of {len(frame_base64_list)} images for the figure: '{figure_name}'. "
-        f"Observations: '{observations}'. "
-        "Calculate the score based on the three key transitions (T1, T2, T3) inherent in this figure. "
-        f"Reference the following judging guidelines: {prompt_template.get('content', 'No guidelines provided')}. "
-        
-        # *** STRICT FORMATTING REQUIREMENT (Retained) ***
-        "**CRITICAL INSTRUCTION: THE ENTIRE OUTPUT MUST BE FORMATTED EXACTLY LIKE THE EXAMPLE PROVIDED TO YOU. "
-        "The assessment MUST start with the score summary, followed by a single HTML <table> with the required six columns: "
-        "Transition, Max NVT, Max PV, Awarded PV, Awarded NVT, Key Observations. "
-        "Do NOT use Markdown tables. Only use the HTML <table> format.** "
-        "End the response with a 'Deductions' list and a 'What to Improve' list with numerical PV points."
-    )
-    gemini_content.append(prompt_text)
-
-    # 2. Convert Base64 strings back to binary Parts for Gemini
-    for b64_data in frame_base64_list:
-        try:
-            image_bytes = base64.b64decode(b64_data)
-            # Create the Gemini Part object directly from binary data
-            image_part = Part.from_bytes(data=image_bytes, mime_type='image/jpeg')
-            gemini_content.append(image_part)
-        except Exception as e:
-            # Skip corrupted Base64 or decoding errors
-            print(f"Error decoding Base64 image: {e}")
-            continue
-
-    files_processed = len(frame_base64_list)
-    print(f"Sending {files_processed} Base64 images and complex, strictly-formatted prompt to {MODEL_NAME}...")
-
-    if files_processed == 0:
-        return JSONResponse(status_code=400, content={"llm_output": "Error: No frames were processed for the model."})
-
-    # --- GEMINI API Call & Response Handling ---
-    output_text = ""
+        frame_base64_list: List[str] = json.loads(frame_base64_json)
+        if not isinstance(frame_base64_list, list) or not all(isinstance(f, str) for f in frame_base64_list):
+            raise ValueError("expected a JSON array of base64 strings")
+    except ValueError as e:
+        status = 400
+        timer.observe(status)
+        return timed_response({"llm_output": f"Error: Invalid frame_base64_json: {e}"}, timer, timings, status)
     try:
-        completion = client.models.generate_content(
-            model=MODEL_NAME, 
-            contents=gemini_content,
-            config=genai.types.GenerateContentConfig(
-                max_output_tokens=MAX_OUTPUT_TOKENS
-            )
-        )
-        
-        output_text = completion.text
-        
-        if not output_text:
-            finish_reason = completion.candidates[0].finish_reason.name if completion.candidates else "UNKNOWN"
-            if finish_reason == 'SAFETY':
-                print("WARNING: Gemini blocked the response due to safety filters.")
-                output_text = "## 🚨 Response Blocked by Safety Filters\n\nTry adjusting your prompt or selecting different frames."
-            else:
-                print(f"WARNING: Gemini returned a blank response string. Finish Reason: {finish_reason}")
-                output_text = f"The AI returned a blank response (Reason: {finish_reason}). Check the server logs for details."
-        else:
-            print(f"Gemini API call successful. First 100 chars: {output_text[:100]}...") 
-
-    except APIError as e:
-        output_text = f"Gemini API call failed (APIError). Status: {e.status_code}. Details: {e.message}"
-        print(f"FATAL LLM API ERROR: {e}")
-    except Exception as e:
-        output_text = f"LLM call failed (General Exception): {type(e).__name__}: {e}"
-        print(f"FATAL LLM ERROR: {e}")
-
-    return {
-        "llm_output": output_text,
-        "num_frames": files_processed,
-        "figure_name": figure_name,
-        "observations": observations
-    }
\ No newline at end of file
+        # Identical judgement already in flight (e.g. a double submit)? Share its result.
+        cache_key = await run_in_threadpool(judgement_key, figure_name, observations, frame_base64_list)
+        started = time.perf_counter()
+        # No point paying for an LLM answer nobody will read
+        async with cancel_scope(request, JUDGE_DEADLINE_SEC) as cancel:
+            result, shared = await judgement_flight.do(cache_key, lambda: run_in_threadpool(
+                run_judgement, figure_name, observations, frame_base64_list, athlete, timer=timer, cancel=cancel
+            ))
+        if shared:
+            timer.add("coalesced_wait", time.perf_counter() - started)
+            result = {**result, "coalesced": True}
+            # Saved by the request that did the work (or cached, so it succeeded):
+            # save it for this request's athlete too
+            if "judgement_id" in result or shared == "host":
+                result = await run_in_threadpool(with_history, result, athlete)
+        BYTES_OUT.inc(len(result["llm_output"]), endpoint="judge_base64_frames")
+        return timed_response(result, timer, timings)
+    except RequestCancelled as e:
+        CANCELLED_REQUESTS.inc(endpoint="judge_base64_frames", reason=e.reason)
+        status = cancelled_status(e.reason)
+        return timed_response({"llm_output": f"Error: Judgement cancelled ({e.reason})."}, timer, timings, status)
+    except json.JSONDecodeError as e:
+        status = 500
+        return timed_response({"llm_output": f"Error: Invalid JSON in as_judging.json: {e}"}, timer, timings, status)
+    except ValueError as e:
+        status = 400
+        return timed_response({"llm_output": f"Error: {e}"}, timer, timings, status)
+    except Exception:
+        status = 500
+        raise
+    finally:
+        timer.observe(status)
+
+
+# ------------------------
+# Health & readiness
+# ------------------------
+@app.get("/healthz")
+def healthz():
+    # Liveness: answers as soon as uvicorn is up, without touching heavy modules
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    # Readiness: 503 until the warm-up has loaded OpenCV and the Gemini client
+    content = {"ready": startup_state["ready"], "startup_mode": STARTUP_MODE, **startup_state}
+    return JSONResponse(status_code=200 if startup_state["ready"] else 503, content=content)
+
+
+# ------------------------
+# Metrics (Prometheus text format)
+# ------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    record_peak_rss()
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
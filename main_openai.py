@@ -3,7 +3,6 @@ import cv2
 import tempfile
 import json
 import uuid
-import time 
 import base64 
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -12,6 +11,8 @@ from fastapi.staticfiles import StaticFiles
 from openai import OpenAI
 from typing import List
 
+from app.logging_utils import setup_logging, get_logger
+
 # ------------------------
 # Config
 # ------------------------
@@ -25,6 +26,9 @@ SAMPLE_VIDEO_PATH = "/static/videos/sample_video.mp4"
 os.makedirs(FRAME_DIR, exist_ok=True)
 os.makedirs(VIDEO_DIR, exist_ok=True)
 
+setup_logging()
+logger = get_logger("openai")
+
 
 # ------------------------
 # App setup
@@ -539,7 +543,7 @@ async def judge_frames(
                 # Read file, encode to Base64, and decode to UTF-8 string
                 encoded_image = base64.b64encode(image_file.read()).decode('utf-8')
         except FileNotFoundError:
-            print(f"File not found for Base64 encoding: {path}")
+            logger.warning("File not found for Base64 encoding: %s", path)
             continue 
 
         # 3. Add the Base64 data to the content list
@@ -551,14 +555,7 @@ async def judge_frames(
             }
         })
     
-    # --- OPTIONAL: Debug Print and Delay ---
-    print("--- DEBUG: First few characters of Base64 content sent to OpenAI ---")
-    for item in base64_content:
-        if item.get('type') == 'image_url':
-            print(item['image_url']['url'][:50] + "...") 
-    print("-------------------------------------------------------------------")
-    time.sleep(1) 
-    # --- END OPTIONAL ---
+    logger.debug("Sending %d images to %s.", len(base64_content) - 1, MODEL_NAME)
 
     try:
         completion = client.chat.completions.create(
@@ -574,7 +571,7 @@ async def judge_frames(
         output_text = completion.choices[0].message.content
     except Exception as e:
         output_text = f"LLM call failed: {type(e).__name__}: {e}"
-        print(f"FATAL LLM ERROR: {e}")
+        logger.exception("LLM call failed: %s", e)
 
     return {
         "llm_output": output_text,
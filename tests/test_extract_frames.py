@@ -0,0 +1,16 @@
+import pytest
+
+from app.video_utils import extract_key_frames, MIN_DETAIL_STD
+from benchmarks.bench_extract_frames import make_video
+
+
+# Ordinary clips must pass the blank-frame gate (MIN_DETAIL_STD), which is measured
+# on full-size frames; on the 320 px scoring thumbnails these clips fall below it.
+# The benchmark clips are generated on first use (benchmarks/results/ isn't committed).
+@pytest.mark.parametrize("width, height, codec", [(640, 360, "mp4v"), (1280, 720, "mjpg")])
+def test_benchmark_clip_yields_frames(width, height, codec):
+    path = make_video(width, height, 30, 5, codec)
+    if path is None:
+        pytest.skip(f"{codec} not available in this OpenCV build")
+    result = extract_key_frames(path)
+    assert result["frames"], f"no frames kept from {path} (MIN_DETAIL_STD={MIN_DETAIL_STD})"
@@ -0,0 +1,24 @@
+import numpy as np
+import cv2
+
+from app.frame_hash import unique_indices
+
+
+def _pool_frame(x, rng_seed=0):
+    rng = np.random.default_rng(rng_seed)
+    frame = np.full((360, 640, 3), (200, 150, 40), np.uint8)
+    texture = cv2.GaussianBlur(rng.integers(0, 40, (360, 640)).astype(np.uint8), (0, 0), 3)
+    frame = cv2.add(frame, cv2.merge([texture] * 3))
+    cv2.ellipse(frame, (x, 180), (18, 40), 0, 0, 360, (60, 90, 200), -1)
+    return frame
+
+
+# A small swimmer at different spots in the same pool is a different picture
+def test_small_moving_figure_is_not_a_duplicate():
+    frames = [_pool_frame(x) for x in range(40, 600, 56)]
+    assert len(unique_indices(frames)) == len(frames)
+
+
+def test_identical_frames_collapse():
+    frame = _pool_frame(200)
+    assert unique_indices([frame, frame.copy(), _pool_frame(500)]) == [0, 2]